@@ -1,29 +1,40 @@
+import os
+
 import streamlit as st
-import polars as pl
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 
-from lib_predicteur import meilleures_voitures
+from lib_profilage import mesures
+
+# Les bibliothèques lourdes (polars, pandas, matplotlib, seaborn, scikit-learn)
+# sont importées dans les pages qui en ont besoin : la page d'accueil, qui n'affiche
+# que du texte, démarre sans elles.
 
 
 @st.cache_data
 def load_data():
+    import polars as pl
+
     return pl.read_json("annonces.json")
 
 
 @st.cache_resource
-def load_meilleures_voitures(boite: str):
-    best_voitures = meilleures_voitures("annonces.json", boite)
-    return best_voitures
+def prechauffer():
+    """Charge les données et lance l'entraînement des deux types de boîte en
+    arrière-plan, une seule fois par processus, à la première session ouverte
+    (Streamlit n'exécute pas le script au lancement du serveur). Pour que les
+    modèles soient prêts avant le premier visiteur, lancer `prechauffage.py`.
+    """
+    from lib_entrainement import lancer_entrainement
+
+    load_data()
+    for boite in ("Manuelle", "Automatique"):
+        lancer_entrainement("annonces.json", boite)
 
 
 st.set_page_config(page_title="PriceAuto")
 st.title("PriceAuto ✔️​")
 
-df = load_data()
-
-couleur = sns.color_palette("Blues_d")[1]
+if os.environ.get("PRICEAUTO_PRECHAUFFAGE") == "1":
+    prechauffer()
 
 def Accueil():
     st.markdown(
@@ -72,6 +83,14 @@ def Accueil():
 
 
 def Donnees():
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    from lib_requetes import compter_par
+
+    df = load_data()
+    couleur = sns.color_palette("Blues_d")[1]
+
     st.subheader("Données des voitures 📈")
     st.markdown(
         """ 
@@ -115,10 +134,7 @@ def Donnees():
 
     if option == "Marque":
 
-        marques_count = df.group_by("Marque").agg(pl.len().alias("Nombre de voitures"))
-        marques_count_sorted = marques_count.sort("Nombre de voitures", descending=True)
-
-        top_10_marques = marques_count_sorted.head(10)
+        top_10_marques = compter_par(df, "Marque", k=10)
         top_10_marques_pandas = top_10_marques.to_pandas()
 
         fig, ax = plt.subplots(figsize=(12, 8))
@@ -145,10 +161,7 @@ def Donnees():
 
     elif option == "Boite":
 
-        boite_count = df.group_by("Boite").agg(pl.len().alias("Nombre de voitures"))
-        boite_count_sorted = boite_count.sort("Nombre de voitures", descending=True)
-
-        type_boite = boite_count_sorted.head(10)
+        type_boite = compter_par(df, "Boite", k=10)
         type_boite_pandas = type_boite.to_pandas()
 
         fig, ax = plt.subplots(figsize=(12, 8))
@@ -176,9 +189,7 @@ def Donnees():
 
     elif option == "Energie":
 
-        energie_count = df.group_by("Energie").agg(pl.len().alias("Nombre de voitures"))
-
-        energie_count_sorted = energie_count.sort("Nombre de voitures", descending=True)
+        energie_count_sorted = compter_par(df, "Energie")
 
         energie_count_sorted_pd = energie_count_sorted.to_pandas()
 
@@ -260,6 +271,10 @@ def Donnees():
 
 
 def Filtrer():
+    from lib_requetes import filtrer_prix
+
+    df = load_data()
+
     st.subheader("Filtrer les voitures 🔍​")
 
     st.write(
@@ -298,13 +313,7 @@ def Filtrer():
         step=10,
     )
 
-    filtered_data = df.filter((df["Prix"] >= prix[0]) & (df["Prix"] <= prix[1]))
-
-    columns = [col for col in filtered_data.columns if col != "Référence"] + [
-        "Référence"
-    ]
-    filtered_data = filtered_data.select(columns)
-    filtered_data_pandas = filtered_data.to_pandas()
+    filtered_data_pandas = filtrer_prix(df, prix[0], prix[1])
 
     st.dataframe(
         filtered_data_pandas.style.hide(axis="index"),
@@ -349,36 +358,69 @@ def Predictions():
     boite = st.selectbox("Choisissez le type de boîte", ["Manuelle", "Automatique"])
 
     if st.button("Afficher les meilleures voitures"):
+        st.session_state["boite_predictions"] = boite
 
-        liste_voitures = load_meilleures_voitures(boite)
+    if st.session_state.get("boite_predictions") == boite:
+        from lib_entrainement import lancer_entrainement
 
-        indices_voitures = liste_voitures[1]
+        tache = lancer_entrainement("annonces.json", boite)
+        if tache.terminee:
+            Resultats_entrainement(tache)
+        else:
+            Suivi_entrainement(tache)
 
-        data = pd.read_json("annonces.json")
-        voitures_affichage = []
+    st.sidebar.markdown("Prédiction des prix")
 
-        for i in indices_voitures:
-            voiture = data.loc[
-                i,
-                [
-                    "Nom",
-                    "Prix",
-                    "Mensualité",
-                    "Puissance",
-                    "Energie",
-                    "Kilomètre",
-                    "Année",
-                    "Localisation",
-                    "Référence",
-                ],
-            ]
-            voitures_affichage.append(voiture)
 
-        df_voitures = pd.DataFrame(voitures_affichage)
+def Resultats_entrainement(tache):
+    from lib_entrainement import lancer_entrainement
 
-        st.write(df_voitures.drop_duplicates())
+    if tache.erreur is None:
+        st.write(tache.voitures.drop_duplicates())
+        Baisses_recentes(tache)
+        return
 
-    st.sidebar.markdown("Prédiction des prix")
+    st.error("L'entraînement des modèles a échoué.")
+    st.code(tache.erreur)
+    if st.button("Réessayer"):
+        lancer_entrainement("annonces.json", tache.boite, relancer=True)
+        st.rerun()
+
+
+# Rafraîchi chaque seconde tant que l'entraînement est en cours : à la fin, on
+# relance toute la page, qui affiche alors les résultats sans ce fragment.
+@st.fragment(run_every="1s")
+def Suivi_entrainement(tache):
+    import pandas as pd
+    from lib_entrainement import derniers_resultats
+
+    if tache.terminee:
+        st.rerun()
+
+    st.progress(tache.avancement, text="Entraînement des modèles en cours...")
+    st.table(
+        pd.DataFrame(
+            {"Étape": tache.progression.keys(), "Statut": tache.progression.values()}
+        )
+    )
+
+    precedente = derniers_resultats(tache.boite)
+    if precedente is not None:
+        st.markdown("Derniers résultats disponibles, en attendant la fin du calcul :")
+        st.write(precedente.voitures.drop_duplicates())
+
+
+def Baisses_recentes(tache):
+    if tache.baisses is None or tache.baisses.empty:
+        return
+
+    st.markdown(
+        """
+        **Baisses de prix récentes 📉** : ces voitures viennent de baisser de prix
+        depuis le relevé précédent et sont maintenant sous leur prix prédit.
+        """
+    )
+    st.write(tache.baisses)
 
 
 page_names_to_funcs = {
@@ -390,3 +432,39 @@ page_names_to_funcs = {
 
 selected_page = st.sidebar.selectbox("Choisis une page", page_names_to_funcs.keys())
 page_names_to_funcs[selected_page]()
+
+
+def Debogage():
+    st.sidebar.markdown("---")
+    if not st.sidebar.checkbox("Mode débogage ⏱️"):
+        return
+
+    if not mesures:
+        st.sidebar.write("Aucune mesure pour le moment.")
+        return
+
+    import pandas as pd
+
+    df_mesures = pd.DataFrame(mesures)
+    colonnes = {
+        "etape": "Étape",
+        "temps_reel_s": "Temps réel (s)",
+        "temps_cpu_s": "Temps CPU (s)",
+        # Présent seulement avec PRICEAUTO_MEMOIRE=1.
+        "pic_memoire_ko": "Pic mémoire de l'étape (Ko)",
+        "rss_max_processus_ko": "Pic mémoire du processus (Ko)",
+    }
+    colonnes = {c: nom for c, nom in colonnes.items() if c in df_mesures}
+    st.sidebar.dataframe(
+        df_mesures[list(colonnes)].rename(columns=colonnes),
+        hide_index=True,
+    )
+    st.sidebar.download_button(
+        "Télécharger la trace json",
+        df_mesures.to_json(orient="records", force_ascii=False),
+        file_name="trace_priceauto.json",
+        mime="application/json",
+    )
+
+
+Debogage()
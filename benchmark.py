@@ -0,0 +1,399 @@
+"""Banc d'essai reproductible du pipeline PriceAuto sur des annonces synthétiques.
+
+Les annonces sont générées avec le même schéma que `annonces.json`, sans accès
+réseau ni GPU. Pour chaque taille, on mesure le chargement, la construction des
+variables (`split()`), la sélection de modèle par famille (`meilleur_modele()`),
+la prédiction par lots (`predire()`), l'export et la prédiction du modèle
+compact (`lib_modele_compact`), la sélection des meilleures voitures
+(`top_voitures()`, avec et sans regroupement des doublons) et les requêtes de filtre de l'application.
+
+Lancer le banc d'essai :
+    python benchmark.py lancer --tailles 10000 100000 1000000 --sortie bench.json
+
+Mesurer le démarrage à froid de l'application (temps jusqu'à l'affichage de
+chaque page et mémoire résidente, dans un nouveau processus à chaque fois) :
+    python benchmark.py demarrage --repetitions 5 --sortie demarrage.json
+
+Comparer deux exécutions (code de retour 1 en cas de régression) :
+    python benchmark.py comparer ancien.json nouveau.json --seuil 0.2
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+
+import numpy as np
+import polars as pl
+
+import lib_profilage
+from lib_profilage import chrono, mesures
+from lib_predicteur import split, meilleur_modele, predire, top_voitures
+from lib_modele_compact import exporter_modele, charger_modele
+from lib_doublons import grappes_doublons
+from lib_requetes import filtrer_prix, compter_par
+
+MARQUES = {
+    "PEUGEOT": ["208", "308", "2008", "3008", "5008"],
+    "RENAULT": ["Clio", "Captur", "Megane", "Austral", "Zoe"],
+    "CITROEN": ["C3", "C3 aircross", "C4", "C5 aircross"],
+    "TOYOTA": ["Yaris", "Aygo x", "C-hr", "Rav4"],
+    "FORD": ["Fiesta", "Focus", "Puma", "Kuga"],
+    "MINI": ["Cooper 3 portes", "Countryman"],
+    "MERCEDES": ["Classe a", "Classe c", "Gla"],
+    "BMW": ["Serie 1", "Serie 3", "X1"],
+}
+ENERGIES = ["Essence", "Diesel", "Hybride", "Electrique"]
+DEPARTEMENTS = ["75", "77", "78", "91", "92", "93", "94", "95", "59", "69", "13", "33"]
+
+
+def generer_annonces(n: int, graine: int = 54) -> pl.DataFrame:
+    """Fonction qui permet de générer `n` annonces synthétiques reproductibles
+    ayant le schéma de `annonces.json`.
+    """
+    rng = np.random.default_rng(graine)
+
+    noms_marques = list(MARQUES)
+    marque = rng.choice(noms_marques, size=n)
+    modele = np.empty(n, dtype="U32")
+    for m, modeles in MARQUES.items():
+        masque = marque == m
+        modele[masque] = rng.choice(modeles, size=masque.sum())
+    annee = rng.integers(2008, 2025, size=n)
+    age = 2025 - annee
+    kilometre = np.maximum((age * rng.normal(13000, 4000, size=n)).astype(np.int64), 10)
+    puissance = rng.integers(60, 400, size=n)
+    boite = np.where(rng.random(n) < 0.6, "Manuelle", "Automatique")
+    prix = (
+        (8000 + puissance * 90) * 0.9**age * rng.lognormal(0, 0.15, size=n)
+        + np.where(boite == "Automatique", 2500, 0)
+    ).astype(np.int64)
+    mensualite = (prix / rng.uniform(70, 100, size=n)).astype(np.int64)
+    departement = rng.choice(DEPARTEMENTS, size=n)
+    localisation = np.char.add(
+        departement, np.char.zfill(rng.integers(0, 1000, n).astype(str), 3)
+    )
+
+    return pl.DataFrame(
+        {
+            "Source": ["synthetique"] * n,
+            "Référence": [
+                f"https://synthetique.priceauto/annonce-{i}" for i in range(n)
+            ],
+            "Nom": np.char.add(np.char.add(marque, " "), modele),
+            "Marque": marque,
+            "Modèle": modele,
+            "Puissance": puissance,
+            "Energie": rng.choice(ENERGIES, size=n),
+            "Année": annee,
+            "Kilomètre": kilometre,
+            "Boite": boite,
+            "Prix": prix,
+            "Mensualité": mensualite,
+            "Localisation": localisation,
+        }
+    ).with_columns(
+        pl.col("Localisation").str.slice(0, 2).is_in(DEPARTEMENTS[:8]).alias("IDF")
+    )
+
+
+def mesurer_taille(
+    n: int, dossier: str, boite: str, max_selection: int, graine: int
+) -> list:
+    """Fonction qui permet d'exécuter toutes les étapes pour une taille donnée
+    et de renvoyer les mesures correspondantes.
+    """
+    del mesures[:]
+
+    fichier = os.path.join(dossier, f"annonces_{n}.json")
+    generer_annonces(n, graine).write_json(fichier)
+
+    with chrono("chargement"):
+        df = pl.read_json(fichier)
+
+    with chrono("variables"):
+        split(fichier, boite)
+
+    # La recherche sur grille est quadratique pour la SVR : au-delà de
+    # `max_selection` lignes, la sélection se fait sur un échantillon.
+    fichier_selection = fichier
+    if n > max_selection:
+        fichier_selection = os.path.join(dossier, f"selection_{n}.json")
+        df.sample(max_selection, seed=graine).write_json(fichier_selection)
+    with chrono("selection", lignes=min(n, max_selection)):
+        modele = meilleur_modele(fichier_selection, boite)[0]
+
+    with chrono("prediction_lots"):
+        df_pred = predire(modele, df, boite)
+
+    dossier_modele = os.path.join(dossier, f"modele_{n}")
+    with chrono("export_compact"):
+        exporter_modele(modele, dossier_modele)
+    with chrono("chargement_compact"):
+        compact = charger_modele(dossier_modele)
+    with chrono("prediction_lots_compacte"):
+        predire(compact, df, boite)
+
+    # Latence d'une requête d'une seule voiture, comme dans l'application.
+    X = split(fichier_selection, boite)[0][:100]
+    with chrono("prediction_unitaire", lignes=len(X)):
+        for ligne in X:
+            modele.predict(ligne[None, :])
+    with chrono("prediction_unitaire_compacte", lignes=len(X)):
+        for ligne in X:
+            compact.predict(ligne[None, :])
+
+    with chrono("top_k"):
+        top_voitures(df_pred)
+
+    with chrono("top_k_regroupe"):
+        top_voitures(df_pred, grappes=grappes_doublons(df).to_numpy())
+
+    prix_min, prix_max = df["Prix"].min(), df["Prix"].max()
+    with chrono("filtre_prix"):
+        filtrer_prix(df, prix_min, (prix_min + prix_max) // 2)
+
+    with chrono("distribution_marques"):
+        compter_par(df, "Marque", k=10)
+
+    return [dict(m, taille=n) for m in mesures]
+
+
+def mesurer_taille_et_memoire(
+    n: int, dossier: str, boite: str, max_selection: int, graine: int, memoire: bool
+) -> list:
+    """Fonction qui permet de mesurer les temps d'une taille avec tracemalloc
+    désactivé, puis, si `memoire` est vrai, de refaire une passe avec tracemalloc
+    pour ajouter le pic mémoire de chaque étape (`pic_memoire_ko`). Le suivi des
+    allocations ralentit fortement le code Python : il ne doit pas fausser les temps.
+    """
+    lib_profilage.memoire_detaillee = False
+    resultats = mesurer_taille(n, dossier, boite, max_selection, graine)
+    if not memoire:
+        return resultats
+
+    lib_profilage.memoire_detaillee = True
+    try:
+        passe_memoire = mesurer_taille(n, dossier, boite, max_selection, graine)
+    finally:
+        lib_profilage.memoire_detaillee = False
+        tracemalloc.stop()
+
+    # Les deux passes exécutent les mêmes étapes dans le même ordre.
+    for resultat, mesure in zip(resultats, passe_memoire, strict=True):
+        assert (resultat["parent"], resultat["etape"]) == (
+            mesure["parent"],
+            mesure["etape"],
+        )
+        resultat["pic_memoire_ko"] = mesure["pic_memoire_ko"]
+    return resultats
+
+
+def lancer(args):
+    # scikit-learn est importé à la demande par lib_predicteur : on importe ici
+    # les mêmes modules que meilleur_modele() pour que leur temps d'import ne
+    # soit pas compté dans la première étape.
+    import sklearn.ensemble  # noqa: F401
+    import sklearn.linear_model  # noqa: F401
+    import sklearn.model_selection  # noqa: F401
+    import sklearn.neighbors  # noqa: F401
+    import sklearn.pipeline  # noqa: F401
+    import sklearn.preprocessing  # noqa: F401
+    import sklearn.svm  # noqa: F401
+
+    resultats = []
+    with tempfile.TemporaryDirectory() as dossier:
+        for n in args.tailles:
+            print(f"Taille {n}...", file=sys.stderr)
+            resultats += mesurer_taille_et_memoire(
+                n,
+                dossier,
+                args.boite,
+                args.max_selection,
+                args.graine,
+                memoire=not args.sans_memoire,
+            )
+
+    parametres = {
+        "tailles": args.tailles,
+        "boite": args.boite,
+        "max_selection": args.max_selection,
+        "graine": args.graine,
+    }
+    _enregistrer(args.sortie, parametres, resultats)
+    return 0
+
+
+def _enregistrer(chemin: str, parametres: dict, resultats: list):
+    rapport = {
+        "machine": {
+            "python": platform.python_version(),
+            "systeme": platform.platform(),
+            "processeur": platform.processor(),
+            "coeurs": os.cpu_count(),
+        },
+        "parametres": parametres,
+        "resultats": resultats,
+    }
+    with open(chemin, "w", encoding="utf-8") as f:
+        json.dump(rapport, f, ensure_ascii=False, indent=2)
+    print(f"Résultats enregistrés dans {chemin}", file=sys.stderr)
+
+
+# Exécuté dans un nouveau processus : démarre l'application sans serveur avec
+# AppTest, affiche la page d'accueil puis, si demandé, une autre page.
+SCRIPT_DEMARRAGE = """
+import json, resource, sys, time
+
+debut = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+
+mesures = {"import_streamlit": time.perf_counter() - debut}
+
+app = AppTest.from_file("application.py", default_timeout=600)
+app.run()
+mesures["Accueil"] = time.perf_counter() - debut
+mesures["rss_accueil_ko"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+page = sys.argv[1]
+if page != "Accueil":
+    app.sidebar.selectbox[0].select(page).run()
+    mesures[page] = time.perf_counter() - debut
+mesures["rss_page_ko"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+print(json.dumps(mesures))
+"""
+
+PAGES = [
+    "Accueil",
+    "Données des voitures",
+    "Filtrer les voitures",
+    "Prédiction du prix",
+]
+
+
+def demarrage(args):
+    """Fonction qui permet de mesurer le démarrage à froid de l'application :
+    pour chaque page, le temps écoulé depuis le lancement du processus jusqu'à
+    la fin de son premier affichage, et le pic de mémoire résidente. Chaque
+    mesure est faite dans un nouveau processus, on garde la médiane.
+    """
+    dossier = os.path.dirname(os.path.abspath(__file__))
+    resultats = []
+    for page in args.pages:
+        essais = []
+        for _ in range(args.repetitions):
+            sortie = subprocess.run(
+                [sys.executable, "-c", SCRIPT_DEMARRAGE, page],
+                cwd=dossier,
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            essais.append(json.loads(sortie.stdout.strip().splitlines()[-1]))
+
+        resultats.append(
+            {
+                "taille": 0,
+                "parent": "demarrage",
+                "etape": page,
+                "temps_reel_s": round(statistics.median(e[page] for e in essais), 6),
+                "import_streamlit_s": round(
+                    statistics.median(e["import_streamlit"] for e in essais), 6
+                ),
+                "rss_max_processus_ko": statistics.median(
+                    e["rss_page_ko"] for e in essais
+                ),
+            }
+        )
+        print(
+            f"{page:<24} {resultats[-1]['temps_reel_s']:.3f} s "
+            f"{resultats[-1]['rss_max_processus_ko'] / 1024:.0f} Mo",
+            file=sys.stderr,
+        )
+
+    parametres = {"pages": args.pages, "repetitions": args.repetitions}
+    _enregistrer(args.sortie, parametres, resultats)
+    return 0
+
+
+def comparer(args):
+    """Fonction qui permet de comparer deux exécutions et de signaler les étapes
+    dont le temps réel ou le pic mémoire augmente de plus de `seuil`.
+    """
+
+    def indexer(chemin):
+        with open(chemin, encoding="utf-8") as f:
+            return {
+                (r["taille"], r["parent"] or "", r["etape"]): r
+                for r in json.load(f)["resultats"]
+            }
+
+    ancien, nouveau = indexer(args.ancien), indexer(args.nouveau)
+
+    regressions = 0
+    for cle in sorted(ancien.keys() & nouveau.keys()):
+        a, b = ancien[cle], nouveau[cle]
+        lignes = []
+        for champ in ("temps_reel_s", "pic_memoire_ko", "rss_max_processus_ko"):
+            if champ not in a or champ not in b or not a[champ]:
+                continue
+            if champ == "temps_reel_s" and a[champ] < args.duree_min:
+                continue
+            ratio = b[champ] / a[champ]
+            drapeau = "REGRESSION" if ratio > 1 + args.seuil else ""
+            regressions += bool(drapeau)
+            lignes.append(f"{champ} {a[champ]} -> {b[champ]} (x{ratio:.2f}) {drapeau}")
+        for ligne in lignes:
+            etape = f"{cle[1]}/{cle[2]}" if cle[1] else cle[2]
+            print(f"{cle[0]:>8} {etape:<40} {ligne}")
+
+    print(f"{regressions} régression(s) au-delà de {args.seuil:.0%}")
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commandes = parser.add_subparsers(dest="commande", required=True)
+
+    p_lancer = commandes.add_parser("lancer", help="exécuter le banc d'essai")
+    p_lancer.add_argument(
+        "--tailles", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    p_lancer.add_argument("--boite", default="Manuelle")
+    p_lancer.add_argument("--max-selection", type=int, default=10_000)
+    p_lancer.add_argument("--graine", type=int, default=54)
+    p_lancer.add_argument(
+        "--sans-memoire",
+        action="store_true",
+        help="ne pas refaire chaque taille avec tracemalloc pour mesurer la mémoire",
+    )
+    p_lancer.add_argument("--sortie", default="benchmark.json")
+    p_lancer.set_defaults(fonction=lancer)
+
+    p_demarrage = commandes.add_parser(
+        "demarrage", help="mesurer le démarrage à froid de l'application"
+    )
+    p_demarrage.add_argument("--pages", nargs="+", default=PAGES)
+    p_demarrage.add_argument("--repetitions", type=int, default=5)
+    p_demarrage.add_argument("--sortie", default="benchmark_demarrage.json")
+    p_demarrage.set_defaults(fonction=demarrage)
+
+    p_comparer = commandes.add_parser("comparer", help="comparer deux exécutions")
+    p_comparer.add_argument("ancien")
+    p_comparer.add_argument("nouveau")
+    p_comparer.add_argument("--seuil", type=float, default=0.2)
+    p_comparer.add_argument("--duree-min", type=float, default=0.01)
+    p_comparer.set_defaults(fonction=comparer)
+
+    args = parser.parse_args(argv)
+    return args.fonction(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+import numpy as np
+import polars as pl
+
+from lib_profilage import chrono
+
+BLOC = ["Marque", "Modèle", "Année", "Puissance"]
+
+
+def grappes_doublons(
+    df: pl.DataFrame, tolerance_km: int = 2000, tolerance_prix: int = 1000
+) -> pl.Series:
+    """Fonction qui permet de regrouper les annonces quasi identiques : même marque,
+    modèle, année et puissance, avec un kilométrage et un prix proches. C'est le
+    cas d'une même voiture publiée par deux concessions, ou de voitures de flotte
+    presque identiques.
+
+    Dans chaque bloc (marque, modèle, année, puissance), les annonces sont
+    parcourues par kilométrage puis prix croissants : une annonce pas encore
+    regroupée devient le représentant d'une grappe, qui reçoit toutes les annonces
+    restantes à `tolerance_km` km et `tolerance_prix` € près de ce représentant.
+    Toute la grappe reste donc dans la tolérance de son représentant, sans
+    enchaînement d'annonces de proche en proche.
+
+    Renvoie, pour chaque ligne de `df`, le numéro de sa grappe : l'indice de la
+    première annonce de la grappe.
+
+    Exemple:
+    >>> grappes_doublons(pl.read_json("annonces.json"))
+    shape: (9870,)
+    Series: 'Grappe' [i64]
+    [0, 1, 2, 2, 4, …]
+    """
+    with chrono("doublons", lignes=len(df)):
+        # Chaque annonce est rangée dans une case (bloc, kilométrage, prix) : les
+        # paires candidates sont cherchées par jointure par hachage sur la case et
+        # ses 8 voisines, au lieu de comparer toutes les annonces entre elles.
+        annonces = df.select(
+            pl.int_range(pl.len(), dtype=pl.Int64).alias("id"),
+            *BLOC,
+            "Kilomètre",
+            "Prix",
+            (pl.col("Kilomètre") // tolerance_km).alias("case_km"),
+            (pl.col("Prix") // tolerance_prix).alias("case_prix"),
+        )
+        voisines = pl.concat(
+            [
+                annonces.with_columns(pl.col("case_km") + dk, pl.col("case_prix") + dp)
+                for dk in (-1, 0, 1)
+                for dp in (-1, 0, 1)
+            ]
+        )
+        paires = annonces.join(
+            voisines, on=[*BLOC, "case_km", "case_prix"], suffix="_b"
+        ).filter(
+            (pl.col("id") != pl.col("id_b"))
+            & ((pl.col("Kilomètre") - pl.col("Kilomètre_b")).abs() <= tolerance_km)
+            & ((pl.col("Prix") - pl.col("Prix_b")).abs() <= tolerance_prix)
+        )
+        ordre = annonces.sort([*BLOC, "Kilomètre", "Prix", "id"])["id"].to_numpy()
+
+        grappes = _representants(
+            len(df), ordre, paires["id"].to_numpy(), paires["id_b"].to_numpy()
+        )
+
+    return pl.Series("Grappe", grappes)
+
+
+def _representants(
+    n: int, ordre: np.ndarray, a: np.ndarray, b: np.ndarray
+) -> np.ndarray:
+    """Regroupe les annonces autour de représentants, dans l'ordre `ordre` : chaque
+    annonce pas encore regroupée reçoit ses voisines (paires `a`-`b`, dans les deux
+    sens) pas encore regroupées. Chaque annonce reçoit ensuite le plus petit indice
+    de sa grappe.
+    """
+    tri = np.argsort(a, kind="stable")
+    a, b = a[tri], b[tri]
+    debuts = np.searchsorted(a, np.arange(n + 1))
+
+    representant = np.full(n, -1)
+    # Seules les annonces qui ont des voisines demandent du travail.
+    for i in ordre[np.diff(debuts)[ordre] > 0].tolist():
+        if representant[i] != -1:
+            continue
+        representant[i] = i
+        voisines = b[debuts[i] : debuts[i + 1]]
+        voisines = voisines[representant[voisines] == -1]
+        representant[voisines] = i
+    isolees = representant == -1
+    representant[isolees] = np.flatnonzero(isolees)
+
+    grappes = np.arange(n)
+    np.minimum.at(grappes, representant, np.arange(n))
+    return grappes[representant]
@@ -0,0 +1,149 @@
+import os
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import pandas as pd
+import polars as pl
+
+from lib_predicteur import meilleur_modele, predict, top_voitures
+from lib_modele_compact import charger_modele, exporter_modele
+from lib_historique import baisses_sous_prediction
+from lib_doublons import grappes_doublons
+
+ETAPES = [
+    "gridsearch/knn",
+    "gridsearch/random_forest",
+    "gridsearch/svr",
+    "gridsearch/regression_lineaire",
+    "reentrainement",
+    "predict",
+    "top_k",
+]
+
+COLONNES_AFFICHAGE = [
+    "Nom",
+    "Prix",
+    "Mensualité",
+    "Puissance",
+    "Energie",
+    "Kilomètre",
+    "Année",
+    "Localisation",
+    "Référence",
+]
+
+DOSSIER_MODELES = os.environ.get("PRICEAUTO_MODELES", "modeles")
+
+_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="entrainement")
+_verrou = threading.Lock()
+_taches = {}
+_derniers_resultats = {}
+
+
+@dataclass
+class Tache:
+    """Entraînement en arrière-plan pour une version des données et une boîte."""
+
+    version: str
+    boite: str
+    progression: dict = field(
+        default_factory=lambda: dict.fromkeys(ETAPES, "en attente")
+    )
+    resultat: list | None = None
+    baisses: pd.DataFrame | None = None
+    voitures: pd.DataFrame | None = None
+    erreur: str | None = None
+    future: object = None
+
+    def signaler(self, etape: str, statut: str):
+        self.progression[etape] = statut
+
+    @property
+    def terminee(self) -> bool:
+        return self.future is not None and self.future.done()
+
+    @property
+    def avancement(self) -> float:
+        faites = sum(s == "terminé" for s in self.progression.values())
+        return faites / len(self.progression)
+
+
+def version_donnees(fichier: str) -> str:
+    """Fonction qui permet d'identifier une version du fichier de données,
+    à partir de sa date de modification et de sa taille.
+    """
+    stat = os.stat(fichier)
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+def _modele(tache: Tache, fichier: str):
+    """Renvoie le modèle de cette version des données. S'il a déjà été exporté
+    (par ce processus ou un autre), le modèle compact est chargé. Sinon, le modèle
+    est entraîné et exporté pour les autres processus, et le modèle scikit-learn
+    est renvoyé : il est plus rapide que le modèle compact pour prédire toutes
+    les annonces d'un coup (Random Forest, KNN).
+    """
+    dossier = os.path.join(DOSSIER_MODELES, f"{tache.boite}-{tache.version}")
+    if os.path.exists(os.path.join(dossier, "meta.json")):
+        for etape in ETAPES[:5]:
+            tache.signaler(etape, "terminé")
+        return charger_modele(dossier)
+    modele = meilleur_modele(fichier, tache.boite, tache.signaler)[0]
+    exporter_modele(modele, dossier)
+    return modele
+
+
+def _executer(tache: Tache, fichier: str):
+    try:
+        modele = _modele(tache, fichier)
+        # Comme meilleures_voitures(), en gardant toutes les prédictions
+        # pour les comparer à l'historique des prix.
+        df_pred = predict(fichier, tache.boite, tache.signaler, modele)[0]
+        tache.signaler("top_k", "en cours")
+        grappes = grappes_doublons(pl.read_json(fichier)).to_numpy()
+        tache.resultat = top_voitures(df_pred, grappes=grappes)
+        tache.signaler("top_k", "terminé")
+        # Les indices renvoyés n'ont de sens que pour cette version du fichier :
+        # on garde les lignes correspondantes avec le résultat.
+        data = pd.read_json(fichier)
+        tache.voitures = data.loc[tache.resultat[1], COLONNES_AFFICHAGE]
+        # Les prédictions de toutes les annonces ne servent qu'à trouver les
+        # baisses : elles ne sont pas gardées dans la tâche.
+        predictions = df_pred.assign(Référence=data["Référence"])
+        tache.baisses = baisses_sous_prediction(pl.from_pandas(predictions)).to_pandas()
+    except Exception:
+        tache.erreur = traceback.format_exc()
+        raise
+    with _verrou:
+        _derniers_resultats[tache.boite] = tache
+
+
+def lancer_entrainement(fichier: str, boite: str, relancer: bool = False) -> Tache:
+    """Fonction qui permet de lancer l'entraînement en arrière-plan pour la version
+    actuelle de `fichier` et la boîte choisie. Si un entraînement existe déjà pour
+    ce couple, il est renvoyé au lieu d'en lancer un nouveau : deux sessions qui
+    cliquent en même temps partagent la même tâche. Un entraînement qui a échoué
+    est conservé avec son erreur et n'est relancé que si `relancer` est vrai.
+    Les tâches des versions précédentes du fichier sont oubliées ; le dernier
+    résultat de chaque boîte reste disponible avec `derniers_resultats()`.
+    """
+    cle = (version_donnees(fichier), boite)
+    with _verrou:
+        tache = _taches.get(cle)
+        if tache is None or (relancer and tache.erreur is not None):
+            for ancienne in [c for c in _taches if c[0] != cle[0]]:
+                del _taches[ancienne]
+            tache = Tache(version=cle[0], boite=boite)
+            tache.future = _pool.submit(_executer, tache, fichier)
+            _taches[cle] = tache
+    return tache
+
+
+def derniers_resultats(boite: str) -> Tache | None:
+    """Fonction qui permet de renvoyer le dernier entraînement terminé avec succès
+    pour cette boîte, quelle que soit la version des données.
+    """
+    with _verrou:
+        return _derniers_resultats.get(boite)
@@ -0,0 +1,256 @@
+import datetime
+import glob
+import os
+import time
+
+import polars as pl
+
+# Historique des annonces : chaque scraping ajoute un relevé (fichier parquet)
+# dans la partition de sa date, sans jamais modifier les relevés précédents :
+#
+#   historique/
+#       index.parquet                       une ligne par Référence
+#       date=2025-01-20/releve-<ns>.parquet
+#       date=2025-01-27/releve-<ns>.parquet
+#
+# Les relevés sont triés par Référence, avec de petits groupes de lignes : un
+# filtre sur la Référence ne lit que les groupes concernés grâce aux statistiques
+# parquet, et un filtre sur la date ne lit que les partitions concernées.
+
+DOSSIER_HISTORIQUE = os.environ.get("PRICEAUTO_HISTORIQUE", "historique")
+
+COLONNES_RELEVE = ["Référence", "Nom", "Prix", "Mensualité", "Kilomètre", "Boite"]
+
+SCHEMA_INDEX = {
+    "Référence": pl.String,
+    "Première vue": pl.Date,
+    "Dernière vue": pl.Date,
+    "Nombre de relevés": pl.UInt32,
+}
+
+
+def _ecrire(df: pl.DataFrame, chemin: str):
+    temporaire = f"{chemin}.tmp"
+    df.write_parquet(temporaire, row_group_size=8192, statistics=True)
+    os.replace(temporaire, chemin)
+
+
+def _scanner(dossier: str) -> pl.LazyFrame:
+    return pl.scan_parquet(
+        os.path.join(dossier, "date=*", "*.parquet"),
+        hive_partitioning=True,
+        hive_schema={"date": pl.Date},
+    )
+
+
+def _releves(dossier: str) -> list:
+    """Chemins des relevés, du plus ancien au plus récent d'après l'horodatage
+    de leur nom, sans les lire.
+    """
+    return sorted(
+        glob.glob(os.path.join(dossier, "date=*", "releve-*.parquet")),
+        key=lambda chemin: int(
+            os.path.basename(chemin).removeprefix("releve-").removesuffix(".parquet")
+        ),
+    )
+
+
+def dates_releves(dossier: str = DOSSIER_HISTORIQUE) -> list:
+    """Fonction qui permet de lister les dates des relevés disponibles,
+    sans lire les fichiers.
+    """
+    return sorted(
+        datetime.date.fromisoformat(os.path.basename(p).removeprefix("date="))
+        for p in glob.glob(os.path.join(dossier, "date=*"))
+    )
+
+
+def ajouter_releve(
+    df: pl.DataFrame, date: datetime.date = None, dossier: str = DOSSIER_HISTORIQUE
+) -> str:
+    """Fonction qui permet d'ajouter un relevé des annonces (sortie de `nettoyage()`)
+    à l'historique, dans la partition de sa date, puis de mettre à jour l'index.
+
+    Exemple:
+    >>> ajouter_releve(nettoyage(voitures))
+    'historique/date=2025-01-27/releve-1737972000000000000.parquet'
+    """
+    date = date or datetime.date.today()
+    horodatage = time.time_ns()
+
+    partition = os.path.join(dossier, f"date={date.isoformat()}")
+    os.makedirs(partition, exist_ok=True)
+    chemin = os.path.join(partition, f"releve-{horodatage}.parquet")
+
+    releve = (
+        df.select(COLONNES_RELEVE)
+        .with_columns(pl.lit(horodatage).alias("Horodatage"))
+        .sort("Référence")
+    )
+    _ecrire(releve, chemin)
+    _mettre_a_jour_index(releve, date, dossier)
+
+    return chemin
+
+
+def _mettre_a_jour_index(releve: pl.DataFrame, date: datetime.date, dossier: str):
+    chemin = os.path.join(dossier, "index.parquet")
+    nouvelles = releve.select(
+        pl.col("Référence"),
+        pl.lit(date).alias("Première vue"),
+        pl.lit(date).alias("Dernière vue"),
+        pl.lit(1, dtype=pl.UInt32).alias("Nombre de relevés"),
+    ).unique("Référence")
+
+    if os.path.exists(chemin):
+        nouvelles = pl.concat([pl.read_parquet(chemin), nouvelles])
+
+    index = (
+        nouvelles.group_by("Référence")
+        .agg(
+            pl.col("Première vue").min(),
+            pl.col("Dernière vue").max(),
+            pl.col("Nombre de relevés").sum(),
+        )
+        .sort("Référence")
+    )
+    _ecrire(index, chemin)
+
+
+def lire_index(dossier: str = DOSSIER_HISTORIQUE) -> pl.DataFrame:
+    chemin = os.path.join(dossier, "index.parquet")
+    if not os.path.exists(chemin):
+        return pl.DataFrame(schema=SCHEMA_INDEX)
+    return pl.read_parquet(chemin)
+
+
+def trajectoire_prix(reference: str, dossier: str = DOSSIER_HISTORIQUE) -> pl.DataFrame:
+    """Fonction qui permet de renvoyer l'évolution du prix d'une annonce.
+    L'index donne la période pendant laquelle l'annonce a été vue : seules les
+    partitions de cette période sont lues.
+    """
+    chemin = os.path.join(dossier, "index.parquet")
+    periode = pl.DataFrame(schema=SCHEMA_INDEX)
+    if os.path.exists(chemin):
+        periode = (
+            pl.scan_parquet(chemin).filter(pl.col("Référence") == reference).collect()
+        )
+    if periode.is_empty():
+        return pl.DataFrame(
+            schema={"date": pl.Date, "Prix": pl.Int64, "Kilomètre": pl.Int64}
+        )
+
+    return (
+        _scanner(dossier)
+        .filter(
+            pl.col("date").is_between(
+                periode["Première vue"][0], periode["Dernière vue"][0]
+            )
+            & (pl.col("Référence") == reference)
+        )
+        .sort("Horodatage")
+        .select("date", "Prix", "Kilomètre")
+        .collect()
+    )
+
+
+def duree_en_ligne(dossier: str = DOSSIER_HISTORIQUE) -> pl.DataFrame:
+    """Fonction qui permet de calculer, pour chaque annonce, le nombre de jours
+    entre sa première et sa dernière apparition, à partir de l'index seul.
+    """
+    return lire_index(dossier).with_columns(
+        (pl.col("Dernière vue") - pl.col("Première vue"))
+        .dt.total_days()
+        .alias("Jours en ligne")
+    )
+
+
+def baisses_de_prix(
+    debut: datetime.date, fin: datetime.date, dossier: str = DOSSIER_HISTORIQUE
+) -> pl.DataFrame:
+    """Fonction qui permet de renvoyer les annonces dont le prix a baissé entre
+    leur premier et leur dernier relevé de la période [debut, fin].
+    """
+    if not _releves(dossier):
+        return pl.DataFrame(
+            schema={
+                "Référence": pl.String,
+                "Nom": pl.String,
+                "Prix initial": pl.Int64,
+                "Prix actuel": pl.Int64,
+                "Baisse": pl.Int64,
+            }
+        )
+
+    return (
+        _scanner(dossier)
+        .filter(pl.col("date").is_between(debut, fin))
+        .select("Référence", "Nom", "Horodatage", "Prix")
+        .sort("Horodatage")
+        .group_by("Référence")
+        .agg(
+            pl.col("Nom").last(),
+            pl.col("Prix").first().alias("Prix initial"),
+            pl.col("Prix").last().alias("Prix actuel"),
+        )
+        .filter(pl.col("Prix actuel") < pl.col("Prix initial"))
+        .with_columns((pl.col("Prix initial") - pl.col("Prix actuel")).alias("Baisse"))
+        .sort("Baisse", descending=True)
+        .collect()
+    )
+
+
+def _prix_du_releve(chemin: str) -> pl.LazyFrame:
+    return (
+        pl.scan_parquet(chemin)
+        .group_by("Référence")
+        .agg(pl.col("Nom").last(), pl.col("Prix").last())
+    )
+
+
+def baisses_recentes(dossier: str = DOSSIER_HISTORIQUE) -> pl.DataFrame:
+    """Fonction qui permet de renvoyer les annonces dont le prix a baissé entre
+    les deux derniers relevés (d'après leur horodatage, qu'ils soient du même
+    jour ou non). Seuls ces deux fichiers sont lus.
+    """
+    releves = _releves(dossier)
+    if len(releves) < 2:
+        return pl.DataFrame(
+            schema={
+                "Référence": pl.String,
+                "Nom": pl.String,
+                "Prix précédent": pl.Int64,
+                "Prix": pl.Int64,
+            }
+        )
+
+    precedent = _prix_du_releve(releves[-2]).select(
+        "Référence", pl.col("Prix").alias("Prix précédent")
+    )
+    return (
+        _prix_du_releve(releves[-1])
+        .join(precedent, on="Référence", how="inner")
+        .filter(pl.col("Prix") < pl.col("Prix précédent"))
+        .select("Référence", "Nom", "Prix précédent", "Prix")
+        .collect()
+    )
+
+
+def baisses_sous_prediction(
+    predictions: pl.DataFrame, dossier: str = DOSSIER_HISTORIQUE
+) -> pl.DataFrame:
+    """Fonction qui permet de repérer les bonnes affaires récentes : les annonces
+    dont le prix vient de baisser et passe sous le prix prédit (il était au moins
+    égal au prix prédit au relevé précédent).
+    `predictions` contient au moins les colonnes Référence et y_pred.
+    """
+    return (
+        baisses_recentes(dossier)
+        .join(predictions.select("Référence", "y_pred"), on="Référence", how="inner")
+        .filter(
+            (pl.col("Prix") < pl.col("y_pred"))
+            & (pl.col("Prix précédent") >= pl.col("y_pred"))
+        )
+        .with_columns((pl.col("y_pred") - pl.col("Prix")).alias("y_pred - y"))
+        .sort("y_pred - y", descending=True)
+    )
@@ -0,0 +1,282 @@
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+# Un modèle compact est un dossier contenant un fichier `meta.json` et un fichier
+# `.npy` par tableau. Les tableaux sont ouverts en lecture seule avec `mmap_mode`,
+# donc chargés instantanément et partagés par le cache du système entre les
+# processus Streamlit qui lisent le même dossier.
+
+
+def _affine(etapes: list) -> tuple:
+    """Combine une suite de MinMaxScaler / StandardScaler en une seule
+    transformation `x * a + b`.
+    """
+    from sklearn.preprocessing import MinMaxScaler, StandardScaler
+
+    a, b = 1.0, 0.0
+    for etape in etapes:
+        if isinstance(etape, MinMaxScaler):
+            a, b = a * etape.scale_, b * etape.scale_ + etape.min_
+        elif isinstance(etape, StandardScaler):
+            moyenne = etape.mean_ if etape.mean_ is not None else 0.0
+            echelle = etape.scale_ if etape.scale_ is not None else 1.0
+            a, b = a / echelle, (b - moyenne) / echelle
+        else:
+            raise ValueError(f"Étape de pipeline non prise en charge : {etape!r}")
+    return np.atleast_1d(np.asarray(a, dtype=np.float64)), np.atleast_1d(
+        np.asarray(b, dtype=np.float64)
+    )
+
+
+def _foret(modele) -> dict:
+    """Aplatit tous les arbres de la forêt dans des tableaux contigus,
+    les indices des enfants étant décalés pour être globaux.
+    """
+    gauche, droite, variable, seuil, valeur, racines = [], [], [], [], [], []
+    decalage = 0
+    for arbre in modele.estimators_:
+        t = arbre.tree_
+        feuille = t.children_left == -1
+        racines.append(decalage)
+        gauche.append(np.where(feuille, -1, t.children_left + decalage))
+        droite.append(np.where(feuille, -1, t.children_right + decalage))
+        variable.append(np.where(feuille, 0, t.feature))
+        seuil.append(t.threshold)
+        valeur.append(t.value[:, 0, 0])
+        decalage += t.node_count
+    return {
+        "gauche": np.concatenate(gauche).astype(np.int32),
+        "droite": np.concatenate(droite).astype(np.int32),
+        "variable": np.concatenate(variable).astype(np.int32),
+        "seuil": np.concatenate(seuil).astype(np.float64),
+        "valeur": np.concatenate(valeur).astype(np.float64),
+        "racines": np.asarray(racines, dtype=np.int32),
+    }
+
+
+def _tableaux(modele) -> tuple:
+    """Renvoie le type de modèle compact, ses paramètres et ses tableaux."""
+    # scikit-learn n'est nécessaire qu'à l'export : charger_modele() et
+    # ModeleCompact.predict() n'utilisent que numpy.
+    from sklearn.pipeline import Pipeline
+    from sklearn.linear_model import LinearRegression
+    from sklearn.neighbors import KNeighborsRegressor
+    from sklearn.svm import SVR
+    from sklearn.ensemble import RandomForestRegressor
+
+    etapes = []
+    if isinstance(modele, Pipeline):
+        etapes = [etape for _, etape in modele.steps[:-1]]
+        modele = modele.steps[-1][1]
+    a, b = _affine(etapes)
+    tableaux = {"echelle": a, "decalage": b}
+
+    if isinstance(modele, LinearRegression):
+        tableaux["coef"] = np.ravel(modele.coef_).astype(np.float64)
+        tableaux["intercept"] = np.ravel(modele.intercept_).astype(np.float64)
+        return "lineaire", {}, tableaux
+
+    if isinstance(modele, SVR):
+        tableaux["intercept"] = np.ravel(modele.intercept_).astype(np.float64)
+        if modele.kernel == "linear":
+            tableaux["coef"] = np.ravel(modele.coef_).astype(np.float64)
+            return "lineaire", {}, tableaux
+        if modele.kernel == "rbf":
+            tableaux["vecteurs"] = modele.support_vectors_.astype(np.float64)
+            tableaux["dual"] = np.ravel(modele.dual_coef_).astype(np.float64)
+            return "svr_rbf", {"gamma": float(modele._gamma)}, tableaux
+        raise ValueError(f"Noyau SVR non pris en charge : {modele.kernel}")
+
+    if isinstance(modele, KNeighborsRegressor):
+        if modele.effective_metric_ != "euclidean":
+            raise ValueError(f"Métrique KNN non prise en charge : {modele.metric}")
+        tableaux["X"] = np.asarray(modele._fit_X, dtype=np.float64)
+        tableaux["y"] = np.ravel(modele._y).astype(np.float64)
+        parametres = {"n_neighbors": modele.n_neighbors, "weights": modele.weights}
+        return "knn", parametres, tableaux
+
+    if isinstance(modele, RandomForestRegressor):
+        tableaux.update(_foret(modele))
+        return "foret", {}, tableaux
+
+    raise ValueError(f"Modèle non pris en charge : {modele!r}")
+
+
+def exporter_modele(modele, dossier: str):
+    """Fonction qui permet d'enregistrer le modèle choisi par `meilleur_modele()`
+    sous forme compacte dans `dossier`. L'écriture se fait dans un dossier
+    temporaire renommé à la fin, pour qu'un autre processus ne lise jamais
+    un modèle à moitié écrit. Si `dossier` existe déjà (un autre processus a
+    exporté le même modèle en même temps), l'export existant est conservé :
+    un modèle publié n'est jamais supprimé.
+
+    Exemple:
+    >>> modele = meilleur_modele("annonces.json", boite="Manuelle")[0]
+    >>> exporter_modele(modele, "modeles/Manuelle")
+    """
+    type_modele, parametres, tableaux = _tableaux(modele)
+
+    parent = os.path.dirname(os.path.abspath(dossier))
+    os.makedirs(parent, exist_ok=True)
+    temporaire = tempfile.mkdtemp(dir=parent)
+    try:
+        # mkdtemp crée le dossier en 0700 : on le rend lisible par les processus
+        # Streamlit qui tourneraient sous un autre utilisateur.
+        os.chmod(temporaire, 0o755)
+        for nom, tableau in tableaux.items():
+            np.save(
+                os.path.join(temporaire, f"{nom}.npy"), np.ascontiguousarray(tableau)
+            )
+        with open(os.path.join(temporaire, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "type": type_modele,
+                    "parametres": parametres,
+                    "tableaux": list(tableaux),
+                },
+                f,
+            )
+    except BaseException:
+        shutil.rmtree(temporaire, ignore_errors=True)
+        raise
+
+    try:
+        if not os.path.exists(dossier):
+            os.replace(temporaire, dossier)
+    except OSError:
+        # Un autre processus a publié `dossier` entre le test et le renommage.
+        if not os.path.exists(os.path.join(dossier, "meta.json")):
+            shutil.rmtree(temporaire, ignore_errors=True)
+            raise
+    shutil.rmtree(temporaire, ignore_errors=True)
+
+
+class ModeleCompact:
+    """Modèle de prédiction chargé depuis un dossier écrit par `exporter_modele()`.
+    Il expose `predict(X)` comme un estimateur scikit-learn.
+    """
+
+    def __init__(self, type_modele: str, parametres: dict, tableaux: dict):
+        self.type = type_modele
+        self.parametres = parametres
+        self.tableaux = tableaux
+
+    def predict(self, X, taille_bloc: int = 1024) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float64)
+        # Par blocs, pour borner la taille des matrices intermédiaires
+        # (lignes x arbres, lignes x vecteurs de support, lignes x voisins).
+        return np.concatenate(
+            [
+                self._predict_bloc(X[i : i + taille_bloc])
+                for i in range(0, len(X), taille_bloc)
+            ]
+            or [np.empty(0)]
+        )
+
+    def _predict_bloc(self, X: np.ndarray) -> np.ndarray:
+        t = self.tableaux
+        if self.type == "foret":
+            return _predire_foret(t, X)
+
+        X = X * t["echelle"] + t["decalage"]
+        if self.type == "lineaire":
+            return X @ t["coef"] + t["intercept"][0]
+        if self.type == "svr_rbf":
+            distances = _distances_carrees(X, t["vecteurs"])
+            noyau = np.exp(-self.parametres["gamma"] * distances)
+            return noyau @ t["dual"] + t["intercept"][0]
+        if self.type == "knn":
+            return _predire_knn(self.parametres, t, X)
+        raise ValueError(f"Type de modèle compact inconnu : {self.type}")
+
+
+def _distances_carrees(X: np.ndarray, Y: np.ndarray) -> np.ndarray:
+    distances = X @ Y.T
+    distances *= -2
+    distances += (X**2).sum(axis=1)[:, None]
+    distances += (Y**2).sum(axis=1)[None, :]
+    return np.maximum(distances, 0, out=distances)
+
+
+def _predire_knn(parametres: dict, t: dict, X: np.ndarray) -> np.ndarray:
+    voisins, distances = _k_plus_proches(X, t["X"], parametres["n_neighbors"])
+    d = np.sqrt(distances)
+    y = t["y"][voisins]
+    if parametres["weights"] == "uniform":
+        return y.mean(axis=1)
+    # Comme scikit-learn : un voisin à distance nulle prend tout le poids.
+    with np.errstate(divide="ignore"):
+        poids = 1 / d
+    nuls = np.isinf(poids)
+    lignes_nulles = nuls.any(axis=1)
+    poids[lignes_nulles] = nuls[lignes_nulles]
+    return (poids * y).sum(axis=1) / poids.sum(axis=1)
+
+
+def _k_plus_proches(X: np.ndarray, Y: np.ndarray, k: int) -> tuple:
+    """Indices et distances au carré des `k` plus proches voisins de chaque ligne
+    de `X` parmi les lignes de `Y`, triés par distance. Comme scikit-learn, en cas
+    d'égalité de distance, le voisin d'indice le plus petit est retenu.
+    """
+    k = min(k, len(Y))
+    # La formule |x|² - 2xy + |y|² (produit matriciel) est rapide mais arrondie :
+    # elle ne sert qu'à trouver les candidats, dont la distance approchée est à
+    # moins d'une marge d'erreur de la k-ième. Les égalités de distance sont
+    # fréquentes (annonces identiques) : les distances des seuls candidats sont
+    # recalculées exactement, variable par variable, avant de les départager.
+    approchees = _distances_carrees(X, Y)
+    kieme = np.partition(approchees, k - 1, axis=1)[:, k - 1 : k]
+    normes = (X**2).sum(axis=1)[:, None] + (Y**2).sum(axis=1).max()
+    marge = 1e-9 * (normes + 1)
+    lignes, colonnes = np.nonzero(approchees <= kieme + marge)
+    # Candidats de chaque ligne par indice croissant, pour que le tri stable
+    # départage les égalités comme scikit-learn ; les lignes qui en ont moins
+    # que les autres sont complétées par des candidats à distance infinie.
+    nb_candidats = np.bincount(lignes, minlength=len(X))
+    debuts = np.cumsum(nb_candidats) - nb_candidats
+    positions = np.arange(len(colonnes)) - debuts[lignes]
+    candidats = np.zeros((len(X), nb_candidats.max()), dtype=np.intp)
+    candidats[lignes, positions] = colonnes
+    complements = np.arange(candidats.shape[1]) >= nb_candidats[:, None]
+    exactes = np.zeros(candidats.shape)
+    for j in range(X.shape[1]):
+        exactes += (X[:, j, None] - Y[candidats, j]) ** 2
+    exactes[complements] = np.inf
+    ordre = np.argsort(exactes, axis=1, kind="stable")[:, :k]
+    return (
+        np.take_along_axis(candidats, ordre, axis=1),
+        np.take_along_axis(exactes, ordre, axis=1),
+    )
+
+
+def _predire_foret(t: dict, X: np.ndarray) -> np.ndarray:
+    """Parcourt tous les arbres pour toutes les lignes en même temps."""
+    # scikit-learn compare les variables converties en float32 aux seuils.
+    X = X.astype(np.float32)
+    gauche, droite = t["gauche"], t["droite"]
+    lignes = np.arange(len(X))[:, None]
+    noeuds = np.broadcast_to(t["racines"], (len(X), len(t["racines"]))).copy()
+    actifs = gauche[noeuds] != -1
+    while actifs.any():
+        n = noeuds[actifs]
+        valeurs = X[np.broadcast_to(lignes, noeuds.shape)[actifs], t["variable"][n]]
+        noeuds[actifs] = np.where(valeurs <= t["seuil"][n], gauche[n], droite[n])
+        actifs = gauche[noeuds] != -1
+    return t["valeur"][noeuds].mean(axis=1)
+
+
+def charger_modele(dossier: str) -> ModeleCompact:
+    """Fonction qui permet de charger un modèle compact en mémoire partagée
+    (lecture seule), sans désérialiser d'objet scikit-learn.
+    """
+    with open(os.path.join(dossier, "meta.json"), encoding="utf-8") as f:
+        meta = json.load(f)
+    tableaux = {
+        nom: np.load(os.path.join(dossier, f"{nom}.npy"), mmap_mode="r")
+        for nom in meta["tableaux"]
+    }
+    return ModeleCompact(meta["type"], meta["parametres"], tableaux)
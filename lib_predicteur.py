@@ -1,15 +1,23 @@
 import polars as pl
 import numpy as np
 import pandas as pd
+from contextlib import contextmanager
 
-from sklearn.model_selection import train_test_split, KFold
-from sklearn.model_selection import GridSearchCV
-from sklearn.preprocessing import MinMaxScaler, StandardScaler
-from sklearn.pipeline import Pipeline
-from sklearn.linear_model import LinearRegression
-from sklearn.neighbors import KNeighborsRegressor
-from sklearn.svm import SVR
-from sklearn.ensemble import RandomForestRegressor
+from lib_profilage import chrono
+from lib_doublons import grappes_doublons
+
+
+@contextmanager
+def _etape(nom: str, boite: str, progression=None, **infos):
+    """Mesure une étape avec `chrono()` et signale son avancement à `progression`,
+    fonction appelée avec le nom de l'étape et son statut.
+    """
+    if progression:
+        progression(nom, "en cours")
+    with chrono(nom, boite=boite, **infos):
+        yield
+    if progression:
+        progression(nom, "terminé")
 
 
 def split(fichier: str, boite: str):
@@ -18,12 +26,20 @@ def split(fichier: str, boite: str):
     selon une proportion de 20% pour les données test et 80% pour les données d'entraînement.
 
     """
+    with chrono("split", boite=boite):
+        return _split(fichier, boite)
+
+
+def _split(fichier: str, boite: str):
+    from sklearn.model_selection import train_test_split
+
     df = pl.read_json(fichier)
 
     data_df = df.filter((pl.col("Boite") == boite))
     cible_df = data_df.select("Prix")
     data_df = (
-        data_df.select(pl.exclude("Référence"))
+        data_df.select(pl.exclude("Source"))
+        .select(pl.exclude("Référence"))
         .select(pl.exclude("Nom"))
         .select(pl.exclude("Modèle"))
         .select(pl.exclude("Marque"))
@@ -43,7 +59,7 @@ def split(fichier: str, boite: str):
     return X, y, X_tr, X_te, y_tr, y_te
 
 
-def meilleur_modele(fichier: str, boite: str) -> list:
+def meilleur_modele(fichier: str, boite: str, progression=None) -> list:
     """Fonction qui permet de choisir le meilleur modèle de prédiction
     parmi les KNN, la RandomForest, la SVM et la Régression linéaire.
     Le choix du meilleur modèle repose sur la séléction du meilleur
@@ -55,6 +71,16 @@ def meilleur_modele(fichier: str, boite: str) -> list:
     MAE moyenne : 12670.198689956333
     """
 
+    # scikit-learn n'est importé que pour l'entraînement : prédire avec un
+    # modèle compact (voir lib_modele_compact) n'en a pas besoin.
+    from sklearn.model_selection import KFold, GridSearchCV
+    from sklearn.preprocessing import MinMaxScaler, StandardScaler
+    from sklearn.pipeline import Pipeline
+    from sklearn.linear_model import LinearRegression
+    from sklearn.neighbors import KNeighborsRegressor
+    from sklearn.svm import SVR
+    from sklearn.ensemble import RandomForestRegressor
+
     X, y, X_tr, X_te, y_tr, y_te = split(fichier, boite)
 
     meilleur_estimateur = []
@@ -69,7 +95,8 @@ def meilleur_modele(fichier: str, boite: str) -> list:
         },
         cv=KFold(5),
     )
-    knr_gs.fit(X_tr, y_tr.ravel())
+    with _etape("gridsearch/knn", boite, progression):
+        knr_gs.fit(X_tr, y_tr.ravel())
     meilleur_estimateur.append(knr_gs.best_estimator_)
 
     # RandomForestRegressor
@@ -81,7 +108,8 @@ def meilleur_modele(fichier: str, boite: str) -> list:
         },
         cv=KFold(5),
     )
-    rfr_gs.fit(X_tr, y_tr.ravel())
+    with _etape("gridsearch/random_forest", boite, progression):
+        rfr_gs.fit(X_tr, y_tr.ravel())
     meilleur_estimateur.append(rfr_gs.best_estimator_)
 
     # SVR
@@ -101,20 +129,23 @@ def meilleur_modele(fichier: str, boite: str) -> list:
         },
         cv=KFold(5),
     )
-    svr_gs.fit(X_tr, y_tr.ravel())
+    with _etape("gridsearch/svr", boite, progression):
+        svr_gs.fit(X_tr, y_tr.ravel())
     meilleur_estimateur.append(svr_gs.best_estimator_)
 
     # LinearRegression
     lr = LinearRegression()
-    lr.fit(X_tr, y_tr.ravel())
+    with _etape("gridsearch/regression_lineaire", boite, progression):
+        lr.fit(X_tr, y_tr.ravel())
     meilleur_estimateur.append(lr)
 
     score_train = []
     score_test = []
-    for i in meilleur_estimateur:
-        i.fit(X_tr, y_tr.ravel())
-        score_train.append(i.score(X_tr, y_tr.ravel()))
-        score_test.append(i.score(X_te, y_te.ravel()))
+    with _etape("reentrainement", boite, progression):
+        for i in meilleur_estimateur:
+            i.fit(X_tr, y_tr.ravel())
+            score_train.append(i.score(X_tr, y_tr.ravel()))
+            score_test.append(i.score(X_te, y_te.ravel()))
 
     df_estimateur = pd.DataFrame(
         {
@@ -143,10 +174,12 @@ def meilleur_modele(fichier: str, boite: str) -> list:
     return [meilleur_modele]
 
 
-def predict(fichier: str, boite: str) -> list:
+def predict(fichier: str, boite: str, progression=None, modele=None) -> list:
     """Fonction qui permet de prédire le prix des voitures grâce
     à la fonction meilleur_modele() selon le type de boîte choisie,
-    avec une information sur l'erreur absolue moyenne.
+    avec une information sur l'erreur absolue moyenne. Un modèle déjà
+    entraîné (par exemple chargé avec `charger_modele()`) peut être donné
+    avec `modele` pour éviter l'entraînement.
 
     Exemple:
     >>> predict("annonces.json", boite = "Manuelle")
@@ -169,61 +202,90 @@ def predict(fichier: str, boite: str) -> list:
 
     """
 
-    liste = meilleur_modele(fichier, boite)
-    modele = liste[0]
+    if modele is None:
+        liste = meilleur_modele(fichier, boite, progression)
+        modele = liste[0]
     df = pl.read_json(fichier)
 
-    data_df = df.select(["Kilomètre", "Année", "Puissance", "Mensualité", "IDF"])
-
-    data_df = data_df.with_columns([(1 / pl.col("Kilomètre")).alias("Kilomètre")])
+    df_pred = predire(modele, df, boite, progression=progression)
 
-    target_df = df.select("Prix")
+    mae_moyenne = df_pred["y_pred - y"].abs().mean()
 
-    X = data_df.to_numpy()
-    y = target_df.to_numpy()
-
-    y_pred = []
-    nom = df["Nom"].to_list()
+    print(f"MAE moyenne : {mae_moyenne}")
 
-    for i in range(0, len(data_df)):
-        y_pred.append(modele.predict(X[[i]]))
+    return [df_pred]
 
-    liste_y_pred = [int(pred[0]) for pred in y_pred]
-    liste_y = [int(val[0]) for val in y]
 
-    ecart = [pred - real for pred, real in zip(liste_y_pred, liste_y)]
+def predire(
+    modele,
+    df: pl.DataFrame,
+    boite: str = None,
+    taille_lot: int = 65536,
+    progression=None,
+) -> pd.DataFrame:
+    """Fonction qui permet de calculer les prix prédits par un modèle déjà entraîné
+    pour toutes les voitures de `df`. Les prédictions sont faites par lots de
+    `taille_lot` lignes plutôt que voiture par voiture.
+    """
+    data_df = df.select(["Kilomètre", "Année", "Puissance", "Mensualité", "IDF"])
 
-    mae_per_prediction = [abs(pred - real) for pred, real in zip(liste_y_pred, liste_y)]
-    mae_moyenne = sum(mae_per_prediction) / len(mae_per_prediction)
+    data_df = data_df.with_columns([(1 / pl.col("Kilomètre")).alias("Kilomètre")])
 
-    df_pred = pd.DataFrame(
-        {"Nom": nom, "y": liste_y, "y_pred": liste_y_pred, "y_pred - y": ecart}
+    X = data_df.to_numpy()
+    y = df["Prix"].to_numpy().astype(np.int64)
+
+    with _etape("predict", boite, progression, lignes=len(data_df)):
+        y_pred = np.concatenate(
+            [
+                modele.predict(X[i : i + taille_lot])
+                for i in range(0, len(X), taille_lot)
+            ]
+            or [np.empty(0)]
+        ).astype(np.int64)
+
+    return pd.DataFrame(
+        {"Nom": df["Nom"].to_list(), "y": y, "y_pred": y_pred, "y_pred - y": y_pred - y}
     )
 
-    print(f"MAE moyenne : {mae_moyenne}")
 
-    return [df_pred]
-
-
-def meilleures_voitures(fichier: str, boite: str) -> list:
+def meilleures_voitures(
+    fichier: str, boite: str, progression=None, modele=None, regrouper=False
+) -> list:
     """Fonction qui permet de choisir les 5 meilleures voitures pour lesquelles
-    le prix réel est minimisé par rapport au prix prédit.
+    le prix réel est minimisé par rapport au prix prédit. Avec `regrouper`,
+    les annonces quasi identiques (voir `grappes_doublons()`) ne comptent
+    qu'une fois.
 
     Exemple :
     >>> choix_voitures("annonces.json", boite = "Manuelle")
     [['MERCEDES Amg gt', 'RENAULT Zoe', 'RENAULT Zoe', 'FORD Fiesta', 'RENAULT Captur'], [7508, 6949, 7424, 7344, 6031]]
 
     """
-    liste = predict(fichier, boite)
+    liste = predict(fichier, boite, progression, modele)
     df = liste[0]
-    nom = []
-    indices = []
 
-    df_sorted = df.sort_values(by="y_pred - y", ascending=False)
+    grappes = None
+    if regrouper:
+        grappes = grappes_doublons(pl.read_json(fichier)).to_numpy()
+
+    with _etape("top_k", boite, progression):
+        return top_voitures(df, grappes=grappes)
+
+
+def top_voitures(df: pd.DataFrame, k: int = 5, grappes=None) -> list:
+    """Fonction qui permet de renvoyer les noms et les indices des `k` voitures
+    dont l'écart entre prix prédit et prix réel est le plus grand.
+    Si `grappes` (un numéro de grappe par ligne de `df`) est donné, seule la
+    meilleure voiture de chaque grappe est gardée.
+    """
+    if grappes is not None:
+        df = df.assign(Grappe=grappes)
+        df = df.sort_values("y_pred - y", ascending=False, kind="stable")
+        df = df.drop_duplicates("Grappe")
 
-    top_5 = df_sorted.head(5)
+    top_k = df.nlargest(k, "y_pred - y")
 
-    nom = top_5["Nom"].tolist()
-    indices = top_5.index.tolist()
+    nom = top_k["Nom"].tolist()
+    indices = top_k.index.tolist()
 
     return [nom, indices]
@@ -0,0 +1,155 @@
+import cProfile
+import itertools
+import json
+import logging
+import os
+import resource
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+logger = logging.getLogger("priceauto")
+
+# Configuration par variables d'environnement :
+# - PRICEAUTO_TRACE : chemin du fichier json dans lequel écrire la trace,
+# - PRICEAUTO_PROFIL : dossier dans lequel enregistrer un fichier cProfile par étape.
+#   Un seul profil est actif à la fois dans le processus ; depuis Python 3.12,
+#   cProfile suit tous les threads, donc un profil peut contenir les appels
+#   d'autres threads (entraînements en arrière-plan) exécutés au même moment,
+# - PRICEAUTO_MEMOIRE : "1" pour mesurer le pic mémoire de chaque étape avec tracemalloc.
+#   Le pic de tracemalloc est commun à tout le processus : dans ce mode, les étapes
+#   mesurées de threads différents (entraînements en arrière-plan) s'exécutent
+#   l'une après l'autre pour que leurs pics ne se mélangent pas.
+fichier_trace = os.environ.get("PRICEAUTO_TRACE")
+dossier_profil = os.environ.get("PRICEAUTO_PROFIL")
+memoire_detaillee = os.environ.get("PRICEAUTO_MEMOIRE") == "1"
+
+mesures = []
+
+# Pile des étapes en cours, propre à chaque thread (entraînements en arrière-plan).
+_local = threading.local()
+_profil_actif = False
+_verrou_profil = threading.Lock()
+_numero_profil = itertools.count(1)
+_verrou_memoire = threading.RLock()
+
+
+def _rss_max() -> int:
+    """Pic de mémoire résidente du processus depuis son lancement, en Ko.
+    Ce n'est pas une mesure propre à l'étape.
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+@contextmanager
+def chrono(etape: str, **infos):
+    """Fonction qui permet de mesurer une étape du pipeline : temps réel,
+    temps CPU, pic de mémoire résidente du processus (`rss_max_processus_ko`) et,
+    avec `PRICEAUTO_MEMOIRE=1`, pic mémoire propre à l'étape (`pic_memoire_ko`).
+    La mesure est ajoutée à la liste `mesures`,
+    écrite dans les logs au format json et, si `PRICEAUTO_PROFIL` est défini,
+    accompagnée d'un fichier cProfile (un seul profil à la fois dans le processus,
+    cProfile ne pouvant pas être imbriqué : les étapes lancées pendant qu'un
+    profil est actif, dans ce thread ou un autre, ne sont pas profilées).
+
+    Exemple:
+    >>> with chrono("split", boite="Manuelle"):
+    ...     X, y, X_tr, X_te, y_tr, y_te = split("annonces.json", "Manuelle")
+    """
+    global _profil_actif
+
+    verrou = memoire_detaillee
+    if verrou:
+        _verrou_memoire.acquire()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    pile = _local.__dict__.setdefault("pile", [])
+    parent = pile[-1] if pile else None
+    if parent is not None and tracemalloc.is_tracing():
+        # Le pic atteint jusqu'ici appartient à l'étape parente,
+        # on le conserve avant de remettre le compteur à zéro.
+        parent["pic_enfants"] = max(
+            parent["pic_enfants"], tracemalloc.get_traced_memory()[1]
+        )
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+
+    debut_memoire = (
+        tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+    )
+    courant = {"etape": etape, "pic_enfants": 0}
+    pile.append(courant)
+
+    profil = None
+    if dossier_profil:
+        with _verrou_profil:
+            if not _profil_actif:
+                _profil_actif = True
+                profil = cProfile.Profile()
+        if profil is not None:
+            try:
+                profil.enable()
+            except ValueError:
+                # Un autre profileur (hors de chrono) est déjà actif.
+                profil = None
+                with _verrou_profil:
+                    _profil_actif = False
+
+    debut_reel = time.perf_counter()
+    debut_cpu = time.process_time()
+    try:
+        yield
+    finally:
+        duree_reelle = time.perf_counter() - debut_reel
+        duree_cpu = time.process_time() - debut_cpu
+
+        if profil is not None:
+            profil.disable()
+            with _verrou_profil:
+                _profil_actif = False
+            os.makedirs(dossier_profil, exist_ok=True)
+            # Numéro d'ordre et informations de l'étape (page, boîte...) dans le
+            # nom, pour qu'un appel n'écrase pas le profil du précédent.
+            nom = "_".join(
+                [f"{next(_numero_profil):05d}", etape]
+                + [f"{cle}-{valeur}" for cle, valeur in infos.items()]
+            )
+            nom = nom.replace("/", "_").replace(" ", "_")
+            profil.dump_stats(os.path.join(dossier_profil, f"{nom}.prof"))
+
+        pile.pop()
+
+        mesure = {
+            "etape": etape,
+            "parent": parent["etape"] if parent else None,
+            "temps_reel_s": round(duree_reelle, 6),
+            "temps_cpu_s": round(duree_cpu, 6),
+            "rss_max_processus_ko": _rss_max(),
+        }
+        if tracemalloc.is_tracing():
+            pic = max(tracemalloc.get_traced_memory()[1], courant["pic_enfants"])
+            # Mémoire allouée au plus fort de l'étape, en plus de celle déjà
+            # allouée à son début.
+            mesure["pic_memoire_ko"] = max(pic - debut_memoire, 0) // 1024
+            if parent is not None:
+                parent["pic_enfants"] = max(parent["pic_enfants"], pic)
+        mesure.update(infos)
+
+        if verrou:
+            _verrou_memoire.release()
+
+        mesures.append(mesure)
+        logger.info(json.dumps(mesure, ensure_ascii=False))
+
+
+def exporter_trace(chemin: str | None = None):
+    """Fonction qui permet d'enregistrer toutes les mesures dans un fichier json.
+    Sans chemin, on utilise `PRICEAUTO_TRACE` et rien n'est écrit s'il n'est pas défini.
+    """
+    chemin = chemin or fichier_trace
+    if not chemin:
+        return
+    with open(chemin, "w", encoding="utf-8") as f:
+        json.dump(mesures, f, ensure_ascii=False, indent=2)
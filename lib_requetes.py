@@ -0,0 +1,34 @@
+import pandas as pd
+import polars as pl
+
+# Requêtes des pages de l'application, partagées avec le banc d'essai
+# (`benchmark.py`) pour qu'il mesure exactement ce que l'application exécute.
+
+
+def filtrer_prix(df: pl.DataFrame, prix_min: int, prix_max: int) -> pd.DataFrame:
+    """Fonction qui permet de garder les voitures dont le prix est compris entre
+    `prix_min` et `prix_max`, la colonne Référence étant placée en dernier
+    (page « Filtrer les voitures »).
+
+    Exemple:
+    >>> filtrer_prix(pl.read_json("annonces.json"), 10000, 15000)
+    """
+    filtered_data = df.filter((df["Prix"] >= prix_min) & (df["Prix"] <= prix_max))
+
+    columns = [col for col in filtered_data.columns if col != "Référence"] + [
+        "Référence"
+    ]
+    return filtered_data.select(columns).to_pandas()
+
+
+def compter_par(df: pl.DataFrame, colonne: str, k: int | None = None) -> pl.DataFrame:
+    """Fonction qui permet de compter les voitures par valeur de `colonne`, de la
+    plus fréquente à la moins fréquente, en ne gardant que les `k` premières si `k`
+    est donné (page « Données des voitures »).
+
+    Exemple:
+    >>> compter_par(pl.read_json("annonces.json"), "Marque", k=10)
+    """
+    comptes = df.group_by(colonne).agg(pl.len().alias("Nombre de voitures"))
+    comptes = comptes.sort("Nombre de voitures", descending=True)
+    return comptes.head(k) if k is not None else comptes
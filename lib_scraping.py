@@ -1,159 +1,43 @@
-from requests import get
 import polars as pl
 
-import random
-import time
-import re
-from bs4 import BeautifulSoup
-
-
-def extract_puissance(text):
-    powers = re.findall(r"(\d{1,3})(?:\s*(?:CH|CV|ch|cv|hp)?)", text)
-    powers = [int(power) for power in powers]
-    powers = [power for power in powers if 2 <= power <= 999]
-
-    if powers:
-        return max(powers)
-    return None
-
-
-def extraire_boite(text: str):
-    return re.findall(r"(manuelle|automatique)", text, re.IGNORECASE)
-
-
-def extraire_utilitaire(text: str) -> bool:
-    return bool(re.search(r"UTILITAIRE", text, re.IGNORECASE))
-
+from lib_profilage import chrono, exporter_trace
+from lib_historique import ajouter_releve
+from lib_sources import SOURCES, scraper_sources
 
 motif_boite = r"(Manuelle|Automatique)"
+# Premier nombre du texte, avec ses séparateurs de milliers (espaces, y compris
+# insécables) : "15 799,00 €" -> "15 799", "186 €/mois sur 48 mois" -> "186".
+motif_nombre = r"(\d[\d\s]*)"
+# Année sur quatre chiffres : "2021", "2021 ", "03/2021".
+motif_annee = r"(\d{4})"
 
-voitures = []
-
-for i in range(1, 300):
-    url = f"https://www.autosphere.fr/recherche?market=VO&page={i}&ordre=proximite-asc&critaire_checked[]=year&critaire_checked[]=discount&critaire_checked[]=emission_co2"
-    response = get(url)
-
-    if response.status_code == 200:
-        soup = BeautifulSoup(response.content, "lxml")
-
-        time.sleep(random.uniform(1, 5))
-
-        voiture_list = soup.find_all("div", class_="bloc_infos_veh_parent")
-
-        for voiture in voiture_list:
-
-            try:
-                ref = voiture.find("div", class_="fiche_hover")
-
-                if ref:
-                    link = ref.find("a")
-                    base_ref = link.get("href")
-                    utilitaire = extraire_utilitaire(ref.get_text(strip=True))
-                    marque = ref.find("span", class_="marque").get_text(strip=True)
-                    modele = ref.find("span", class_="modele").get_text(strip=True)
-                else:
-                    ref = None
-                    base_ref = None
-                    utilitaire = None
-                    marque = None
-                    modele = None
 
-            except AttributeError:
-                ref = None
-                base_ref = None
-                utilitaire = None
-                marque = None
-                modele = None
-
-            try:
-                elements = voiture.find("span", class_="serie ellipsis").get_text(
-                    strip=True
-                )
-                puissance = extract_puissance(elements)
-
-            except AttributeError:
-                elements = None
-                puissance = None
-
-            try:
-                caract = voiture.find("div", class_="caract").get_text(strip=True)
-
-                if caract:
-                    elements = [e.strip() for e in caract.split("/")]
-
-                    energie = elements[0] if len(elements) > 0 else None
-                    kilometre = elements[1] if len(elements) > 1 else None
-                    annee = elements[2] if len(elements) > 2 else None
-                    boite = elements[3] if len(elements) > 3 else None
-                else:
-                    energie = None
-                    kilometre = None
-                    annee = None
-                    boite = None
-
-            except AttributeError:
-                caract = None
-                energie = None
-                annee = None
-                kilometre = None
-                boite = None
-
-            try:
-                budget = voiture.find("div", class_="prix_wrapper")
-
-                if budget:
-                    prix = budget.find("span", class_="bloc_prix").get_text(strip=True)
-                    mensualite = budget.find(
-                        "span", class_="mensualite_montant"
-                    ).get_text(strip=True)
-                else:
-                    prix = None
-                    mensualite = None
-
-            except AttributeError:
-                prix = None
-                mensualite = None
-
-            try:
-                footer = voiture.find("div", class_="span12 thumbnail_footer")
-
-                if footer:
-                    localisation = footer.find(
-                        "span", class_="localisation regular"
-                    ).get_text(strip=True)
-                else:
-                    localisation = None
-
-            except AttributeError:
-                localisation = None
-
-            voitures.append(
-                {
-                    "Référence": base_ref,
-                    "Nom": (marque or "") + " " + (modele or ""),
-                    "Marque": marque,
-                    "Modèle": modele,
-                    "Puissance": puissance,
-                    "Energie": energie,
-                    "Année": annee,
-                    "Kilomètre": kilometre,
-                    "Boite": boite,
-                    "Prix": prix,
-                    "Mensualité": mensualite,
-                    "Localisation": localisation,
-                    "Utilitaire": utilitaire,
-                }
-            )
+def premier_nombre(colonne: str) -> pl.Expr:
+    """Fonction qui permet de lire la partie entière du premier nombre d'une
+    colonne de texte, quel que soit le format de la source.
+    """
+    return (
+        pl.col(colonne)
+        .str.extract(motif_nombre)
+        .str.replace_all(r"\s", "")
+        .cast(pl.Int64, strict=False)
+        .alias(colonne)
+    )
 
 
 def nettoyage(liste: list) -> pl.DataFrame:
     """Fonction qui permet de nettoyer les données collectées à la suite
     du scraping : conversion de type, ajout d'une colonne, supression des doublons,
     des valeurs nulles et des colonnes non pertinentes.
+    Les montants et kilométrages sont lus avec `premier_nombre()`, quel que soit
+    le format de la source ("56 581 km", "15 799,00\xa0€", "186 €/mois sur 48 mois"),
+    l'année est la première année sur quatre chiffres ("03/2021") ; une annonce
+    dont un de ces champs est illisible est écartée.
     """
     df = pl.DataFrame(liste)
 
     df = df.select(
+        pl.col("Source"),
         pl.col("Référence"),
         pl.col("Nom"),
         pl.col("Marque"),
@@ -161,23 +45,14 @@ def nettoyage(liste: list) -> pl.DataFrame:
         pl.col("Puissance"),
         pl.col("Energie"),
         pl.col("Utilitaire"),
-        pl.col("Année").cast(pl.Int64).alias("Année"),
-        pl.col("Kilomètre")
-        .str.replace(" km", "")
-        .str.replace(" ", "")
-        .cast(pl.Int64)
-        .alias("Kilomètre"),
+        pl.col("Année")
+        .str.extract(motif_annee)
+        .cast(pl.Int64, strict=False)
+        .alias("Année"),
+        premier_nombre("Kilomètre"),
         pl.col("Boite").str.extract(motif_boite).alias("Boite"),
-        pl.col("Prix")
-        .str.replace("\xa0€", "")
-        .str.replace(" ", "")
-        .cast(pl.Int64)
-        .alias("Prix"),
-        pl.col("Mensualité")
-        .str.replace(" €", "")
-        .str.replace(" ", "")
-        .cast(pl.Int64)
-        .alias("Mensualité"),
+        premier_nombre("Prix"),
+        premier_nombre("Mensualité"),
         pl.col("Localisation").alias("Localisation"),
     )
 
@@ -219,9 +94,15 @@ def nettoyage(liste: list) -> pl.DataFrame:
 def fichier_json(liste: list):
     """Fonction qui permet de convertir le DataFrame en un
     fichier json, afin de faciliter sa manipulation par la suite.
+    Le relevé est aussi ajouté à l'historique des prix.
     """
-    df = nettoyage(liste)
+    with chrono("nettoyage", lignes=len(liste)):
+        df = nettoyage(liste)
     df.write_json("annonces.json")
+    ajouter_releve(df)
+    exporter_trace()
 
 
-fichier_json(voitures)
+if __name__ == "__main__":
+    voitures = scraper_sources(list(SOURCES.values()), pages=299)
+    fichier_json(voitures)
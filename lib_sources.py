@@ -0,0 +1,259 @@
+import logging
+import random
+import re
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
+from requests import get
+from bs4 import BeautifulSoup
+
+from lib_profilage import chrono
+
+logger = logging.getLogger("priceauto")
+
+# Schéma commun des annonces, avant `nettoyage()`. Chaque source renvoie un
+# dictionnaire avec ces clés. La puissance est un entier, l'utilitaire un booléen ;
+# l'année, le kilométrage, le prix et la mensualité peuvent rester sous forme de
+# texte ("56 581 km", "15 799 €"), le nettoyage se charge des conversions.
+SCHEMA = [
+    "Source",
+    "Référence",
+    "Nom",
+    "Marque",
+    "Modèle",
+    "Puissance",
+    "Energie",
+    "Année",
+    "Kilomètre",
+    "Boite",
+    "Prix",
+    "Mensualité",
+    "Localisation",
+    "Utilitaire",
+]
+TEXTE = ["Année", "Kilomètre", "Prix", "Mensualité"]
+
+
+def extract_puissance(text):
+    powers = re.findall(r"(\d{1,3})(?:\s*(?:CH|CV|ch|cv|hp)?)", text)
+    powers = [int(power) for power in powers]
+    powers = [power for power in powers if 2 <= power <= 999]
+
+    if powers:
+        return max(powers)
+    return None
+
+
+def extraire_boite(text: str):
+    return re.findall(r"(manuelle|automatique)", text, re.IGNORECASE)
+
+
+def extraire_utilitaire(text: str) -> bool:
+    return bool(re.search(r"UTILITAIRE", text, re.IGNORECASE))
+
+
+class Source(ABC):
+    """Source d'annonces à scraper. Une nouvelle source hérite de cette classe
+    et définit son `nom`, les `urls()` des pages de résultats, la façon de
+    trouver les `cartes()` d'annonces dans une page et d'`analyser()` une
+    carte en un dictionnaire au schéma `SCHEMA`.
+    """
+
+    nom = ""
+    # Pause aléatoire entre deux requêtes vers cette source, en secondes.
+    delai = (1, 5)
+
+    @abstractmethod
+    def urls(self, pages: int) -> list: ...
+
+    @abstractmethod
+    def cartes(self, soup: BeautifulSoup) -> list: ...
+
+    @abstractmethod
+    def analyser(self, carte) -> dict: ...
+
+    def annonces(self, html: bytes) -> list:
+        """Fonction qui permet d'extraire toutes les annonces d'une page."""
+        soup = BeautifulSoup(html, "lxml")
+        annonces = []
+        for carte in self.cartes(soup):
+            annonce = dict.fromkeys(SCHEMA)
+            annonce.update(self.analyser(carte))
+            annonce["Source"] = self.nom
+            for cle in TEXTE:
+                if annonce[cle] is not None:
+                    annonce[cle] = str(annonce[cle])
+            annonces.append(annonce)
+        return annonces
+
+    def scraper(self, pages: int) -> list:
+        """Fonction qui permet de parcourir les pages de la source une par une,
+        en respectant son délai entre deux requêtes. Une page en erreur (réseau,
+        analyse) est signalée dans les logs et ignorée, sans perdre les autres.
+        """
+        voitures = []
+        for i, url in enumerate(self.urls(pages), start=1):
+            try:
+                with chrono("scraping/requete", source=self.nom, page=i):
+                    response = get(url, timeout=30)
+
+                if response.status_code == 200:
+                    with chrono("scraping/analyse", source=self.nom, page=i):
+                        voitures += self.annonces(response.content)
+                else:
+                    logger.warning(
+                        "Source %s, page %s : code HTTP %s",
+                        self.nom,
+                        i,
+                        response.status_code,
+                    )
+            except Exception:
+                logger.exception("Source %s, page %s : échec", self.nom, i)
+
+            time.sleep(random.uniform(*self.delai))
+        return voitures
+
+
+class Autosphere(Source):
+    """Annonces d'occasion du site autosphere.fr."""
+
+    nom = "autosphere"
+
+    def urls(self, pages: int) -> list:
+        return [
+            f"https://www.autosphere.fr/recherche?market=VO&page={i}&ordre=proximite-asc&critaire_checked[]=year&critaire_checked[]=discount&critaire_checked[]=emission_co2"
+            for i in range(1, pages + 1)
+        ]
+
+    def cartes(self, soup: BeautifulSoup) -> list:
+        return soup.find_all("div", class_="bloc_infos_veh_parent")
+
+    def analyser(self, voiture) -> dict:
+        try:
+            ref = voiture.find("div", class_="fiche_hover")
+
+            if ref:
+                link = ref.find("a")
+                base_ref = link.get("href")
+                utilitaire = extraire_utilitaire(ref.get_text(strip=True))
+                marque = ref.find("span", class_="marque").get_text(strip=True)
+                modele = ref.find("span", class_="modele").get_text(strip=True)
+            else:
+                ref = None
+                base_ref = None
+                utilitaire = None
+                marque = None
+                modele = None
+
+        except AttributeError:
+            ref = None
+            base_ref = None
+            utilitaire = None
+            marque = None
+            modele = None
+
+        try:
+            elements = voiture.find("span", class_="serie ellipsis").get_text(
+                strip=True
+            )
+            puissance = extract_puissance(elements)
+
+        except AttributeError:
+            elements = None
+            puissance = None
+
+        try:
+            caract = voiture.find("div", class_="caract").get_text(strip=True)
+
+            if caract:
+                elements = [e.strip() for e in caract.split("/")]
+
+                energie = elements[0] if len(elements) > 0 else None
+                kilometre = elements[1] if len(elements) > 1 else None
+                annee = elements[2] if len(elements) > 2 else None
+                boite = elements[3] if len(elements) > 3 else None
+            else:
+                energie = None
+                kilometre = None
+                annee = None
+                boite = None
+
+        except AttributeError:
+            caract = None
+            energie = None
+            annee = None
+            kilometre = None
+            boite = None
+
+        try:
+            budget = voiture.find("div", class_="prix_wrapper")
+
+            if budget:
+                prix = budget.find("span", class_="bloc_prix").get_text(strip=True)
+                mensualite = budget.find("span", class_="mensualite_montant").get_text(
+                    strip=True
+                )
+            else:
+                prix = None
+                mensualite = None
+
+        except AttributeError:
+            prix = None
+            mensualite = None
+
+        try:
+            footer = voiture.find("div", class_="span12 thumbnail_footer")
+
+            if footer:
+                localisation = footer.find(
+                    "span", class_="localisation regular"
+                ).get_text(strip=True)
+            else:
+                localisation = None
+
+        except AttributeError:
+            localisation = None
+
+        return {
+            "Référence": base_ref,
+            "Nom": (marque or "") + " " + (modele or ""),
+            "Marque": marque,
+            "Modèle": modele,
+            "Puissance": puissance,
+            "Energie": energie,
+            "Année": annee,
+            "Kilomètre": kilometre,
+            "Boite": boite,
+            "Prix": prix,
+            "Mensualité": mensualite,
+            "Localisation": localisation,
+            "Utilitaire": utilitaire,
+        }
+
+
+SOURCES = {source.nom: source for source in [Autosphere()]}
+
+
+def scraper_sources(sources: list, pages: int) -> list:
+    """Fonction qui permet de scraper plusieurs sources en parallèle : chaque
+    source a son propre fil d'exécution, et donc son propre rythme de requêtes.
+    Une source en échec est signalée dans les logs ; les annonces des autres
+    sources sont conservées.
+
+    Exemple:
+    >>> voitures = scraper_sources([SOURCES["autosphere"]], pages=299)
+    """
+
+    def scraper(source: Source) -> list:
+        try:
+            return source.scraper(pages)
+        except Exception:
+            logger.exception("Source %s : échec du scraping", source.nom)
+            return []
+
+    voitures = []
+    with ThreadPoolExecutor(max_workers=max(len(sources), 1)) as pool:
+        for resultat in pool.map(scraper, sources):
+            voitures += resultat
+    return voitures
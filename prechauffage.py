@@ -0,0 +1,38 @@
+"""Préchauffage de PriceAuto, à lancer avant `streamlit run application.py`.
+
+Entraîne les modèles des deux types de boîte pour la version actuelle de
+`annonces.json` et les exporte sous forme compacte dans `modeles/` : au premier
+affichage de la page de prédiction, l'application n'a plus qu'à les charger.
+
+    python prechauffage.py
+
+Pour préchauffer aussi le cache du processus Streamlit lui-même (données et
+résultats en mémoire), lancer l'application avec `PRICEAUTO_PRECHAUFFAGE=1` :
+ce préchauffage a lieu à l'ouverture de la première session, quelle que soit
+sa page, et non au lancement du serveur.
+"""
+
+import sys
+
+from lib_entrainement import lancer_entrainement
+
+
+def prechauffer(fichier: str = "annonces.json") -> int:
+    taches = [
+        lancer_entrainement(fichier, boite) for boite in ("Manuelle", "Automatique")
+    ]
+    erreurs = 0
+    for tache in taches:
+        tache.future.exception()
+        if tache.erreur is not None:
+            print(
+                f"Échec pour la boîte {tache.boite} :\n{tache.erreur}", file=sys.stderr
+            )
+            erreurs += 1
+        else:
+            print(f"Boîte {tache.boite} prête ({tache.version})", file=sys.stderr)
+    return 1 if erreurs else 0
+
+
+if __name__ == "__main__":
+    sys.exit(prechauffer(*sys.argv[1:]))
@@ -0,0 +1,61 @@
+import polars as pl
+
+from lib_doublons import grappes_doublons
+
+
+def annonces(kilometres: list, prix: list, modele: str = "308") -> pl.DataFrame:
+    n = len(kilometres)
+    return pl.DataFrame(
+        {
+            "Marque": ["PEUGEOT"] * n,
+            "Modèle": [modele] * n,
+            "Année": [2021] * n,
+            "Puissance": [130] * n,
+            "Kilomètre": kilometres,
+            "Prix": prix,
+        }
+    )
+
+
+def test_doublons_regroupes():
+    df = annonces([42_000, 42_800, 90_000], [18_490, 18_990, 12_000])
+
+    assert grappes_doublons(df).to_list() == [0, 0, 2]
+
+
+def test_chaine_kilometrage_non_regroupee():
+    # A-B et B-C sont dans la tolérance, pas A-C : la chaîne ne doit pas
+    # réunir A et C dans la même grappe.
+    df = annonces([10_000, 11_500, 13_000], [15_000] * 3)
+
+    grappes = grappes_doublons(df, tolerance_km=2000).to_list()
+
+    assert grappes[0] == grappes[1]
+    assert grappes[2] != grappes[0]
+
+
+def test_chaine_prix_non_regroupee():
+    df = annonces([30_000] * 4, [15_000, 15_800, 16_600, 17_400])
+
+    grappes = grappes_doublons(df, tolerance_prix=1000).to_list()
+
+    assert grappes == [0, 0, 2, 2]
+
+
+def test_grappe_dans_la_tolerance_du_representant():
+    kilometres = list(range(10_000, 30_000, 500))
+    df = annonces(kilometres, [15_000] * len(kilometres))
+
+    grappes = df.with_columns(grappes_doublons(df, tolerance_km=2000))
+    ecarts = grappes.group_by("Grappe").agg(
+        (pl.col("Kilomètre").max() - pl.col("Kilomètre").min()).alias("Écart")
+    )
+
+    assert ecarts["Écart"].max() <= 2000
+    assert len(ecarts) > 1
+
+
+def test_blocs_differents_jamais_regroupes():
+    df = pl.concat([annonces([20_000], [15_000]), annonces([20_000], [15_000], "208")])
+
+    assert grappes_doublons(df).to_list() == [0, 1]
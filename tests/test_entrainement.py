@@ -0,0 +1,51 @@
+import pytest
+
+import lib_entrainement
+from lib_entrainement import derniers_resultats, lancer_entrainement
+
+
+@pytest.fixture
+def sans_entrainement(monkeypatch):
+    """Remplace l'entraînement par une tâche instantanée."""
+    executees = []
+
+    def executer(tache, fichier):
+        executees.append(tache)
+        with lib_entrainement._verrou:
+            lib_entrainement._derniers_resultats[tache.boite] = tache
+
+    monkeypatch.setattr(lib_entrainement, "_executer", executer)
+    monkeypatch.setattr(lib_entrainement, "_taches", {})
+    monkeypatch.setattr(lib_entrainement, "_derniers_resultats", {})
+    return executees
+
+
+def test_anciennes_versions_oubliees(tmp_path, sans_entrainement):
+    fichier = tmp_path / "annonces.json"
+    fichier.write_text("[]")
+    premiere = lancer_entrainement(str(fichier), "Manuelle")
+    premiere.future.result()
+    assert lancer_entrainement(str(fichier), "Manuelle") is premiere
+
+    fichier.write_text('[{"Prix": 1}]')
+    seconde = lancer_entrainement(str(fichier), "Manuelle")
+    seconde.future.result()
+
+    assert list(lib_entrainement._taches) == [(seconde.version, "Manuelle")]
+    assert derniers_resultats("Manuelle") is seconde
+
+
+def test_echec_conserve_jusqu_a_relance(tmp_path, monkeypatch, sans_entrainement):
+    fichier = tmp_path / "annonces.json"
+    fichier.write_text("[]")
+
+    def echouer(tache, fichier):
+        tache.erreur = "échec"
+        raise RuntimeError("échec")
+
+    monkeypatch.setattr(lib_entrainement, "_executer", echouer)
+    tache = lancer_entrainement(str(fichier), "Automatique")
+    tache.future.exception()
+
+    assert lancer_entrainement(str(fichier), "Automatique") is tache
+    assert lancer_entrainement(str(fichier), "Automatique", relancer=True) is not tache
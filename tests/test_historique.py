@@ -0,0 +1,69 @@
+import datetime
+
+import polars as pl
+
+from lib_historique import (
+    ajouter_releve,
+    baisses_de_prix,
+    baisses_recentes,
+    baisses_sous_prediction,
+    duree_en_ligne,
+    trajectoire_prix,
+)
+
+JOUR = datetime.date(2025, 1, 27)
+
+
+def releve(prix: dict) -> pl.DataFrame:
+    n = len(prix)
+    return pl.DataFrame(
+        {
+            "Référence": list(prix),
+            "Nom": [f"Voiture {reference}" for reference in prix],
+            "Prix": list(prix.values()),
+            "Mensualité": [200] * n,
+            "Kilomètre": [50_000] * n,
+            "Boite": ["Manuelle"] * n,
+        }
+    )
+
+
+def test_historique_vide(tmp_path):
+    assert trajectoire_prix("a", tmp_path).is_empty()
+    assert duree_en_ligne(tmp_path).is_empty()
+    assert baisses_recentes(tmp_path).is_empty()
+    assert baisses_de_prix(JOUR, JOUR, tmp_path).is_empty()
+
+
+def test_deux_releves_le_meme_jour(tmp_path):
+    ajouter_releve(releve({"a": 10_000, "b": 20_000}), JOUR, tmp_path)
+    ajouter_releve(releve({"a": 9_500, "b": 20_000}), JOUR, tmp_path)
+
+    assert trajectoire_prix("a", tmp_path)["Prix"].to_list() == [10_000, 9_500]
+    baisses = baisses_recentes(tmp_path)
+    assert baisses["Référence"].to_list() == ["a"]
+    assert baisses["Prix précédent"].to_list() == [10_000]
+    assert baisses["Prix"].to_list() == [9_500]
+
+
+def test_baisses_recentes_compare_les_deux_derniers_releves(tmp_path):
+    ajouter_releve(releve({"a": 10_000, "b": 20_000}), JOUR, tmp_path)
+    ajouter_releve(releve({"a": 9_500, "b": 20_000}), JOUR, tmp_path)
+    ajouter_releve(releve({"a": 9_500, "b": 19_000}), JOUR, tmp_path)
+
+    assert baisses_recentes(tmp_path)["Référence"].to_list() == ["b"]
+
+
+def test_baisses_sous_prediction(tmp_path):
+    ajouter_releve(releve({"a": 16_000, "b": 10_000, "c": 16_000}), JOUR, tmp_path)
+    lendemain = JOUR + datetime.timedelta(days=1)
+    ajouter_releve(releve({"a": 14_000, "b": 9_900, "c": 15_500}), lendemain, tmp_path)
+    predictions = pl.DataFrame(
+        {"Référence": ["a", "b", "c"], "y_pred": [15_000, 15_000, 15_000]}
+    )
+
+    affaires = baisses_sous_prediction(predictions, tmp_path)
+
+    # b était déjà sous sa prédiction avant sa baisse, c y reste au-dessus.
+    assert affaires["Référence"].to_list() == ["a"]
+    assert affaires["y_pred - y"].to_list() == [1_000]
@@ -0,0 +1,94 @@
+import os
+import stat
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.linear_model import LinearRegression
+from sklearn.neighbors import KNeighborsRegressor
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import MinMaxScaler, StandardScaler
+from sklearn.svm import SVR
+
+from lib_modele_compact import charger_modele, exporter_modele
+from lib_predicteur import split
+
+FICHIER = os.path.join(os.path.dirname(__file__), os.pardir, "annonces.json")
+
+
+def donnees(boite: str = "Manuelle"):
+    """Variables de l'application sur `annonces.json` : beaucoup d'annonces
+    identiques, donc d'égalités de distance entre voisins.
+    """
+    X, y, X_train, X_test, y_train, y_test = split(FICHIER, boite)
+    return X_train, np.ravel(y_train), X
+
+
+MODELES = {
+    "regression_lineaire": lambda: Pipeline(
+        [("scaler", StandardScaler()), ("modele", LinearRegression())]
+    ),
+    "svr_lineaire": lambda: Pipeline(
+        [("scaler", MinMaxScaler()), ("modele", SVR(kernel="linear", C=100))]
+    ),
+    "svr_rbf": lambda: Pipeline(
+        [("scaler", StandardScaler()), ("modele", SVR(kernel="rbf", C=1000))]
+    ),
+    "knn": lambda: Pipeline(
+        [("scaler", MinMaxScaler()), ("modele", KNeighborsRegressor(n_neighbors=3))]
+    ),
+    "knn_distance": lambda: Pipeline(
+        [
+            ("scaler", MinMaxScaler()),
+            ("modele", KNeighborsRegressor(n_neighbors=5, weights="distance")),
+        ]
+    ),
+    "knn_brute": lambda: Pipeline(
+        [
+            ("scaler", MinMaxScaler()),
+            ("modele", KNeighborsRegressor(n_neighbors=3, algorithm="brute")),
+        ]
+    ),
+    "random_forest": lambda: RandomForestRegressor(n_estimators=20, random_state=0),
+}
+
+
+@pytest.mark.parametrize("nom", MODELES)
+def test_modele_compact_identique(nom, tmp_path):
+    X_train, y_train, X = donnees()
+    modele = MODELES[nom]().fit(X_train, y_train)
+
+    dossier = os.path.join(tmp_path, nom)
+    exporter_modele(modele, dossier)
+    compact = charger_modele(dossier)
+
+    np.testing.assert_allclose(compact.predict(X), modele.predict(X), rtol=1e-9)
+    # Une seule ligne, comme dans l'application.
+    np.testing.assert_allclose(compact.predict(X[:1]), modele.predict(X[:1]), rtol=1e-9)
+
+
+def test_knn_egalites_indice_le_plus_petit(tmp_path):
+    # Quatre voisins à la même distance du point 0 : avec k = 2, on garde les
+    # deux d'indice le plus petit, comme scikit-learn.
+    X_train = np.array([[1.0], [-1.0], [1.0], [-1.0], [5.0]])
+    y_train = np.array([10.0, 20.0, 30.0, 40.0, 50.0])
+    modele = KNeighborsRegressor(n_neighbors=2, algorithm="brute").fit(X_train, y_train)
+
+    exporter_modele(modele, os.path.join(tmp_path, "knn"))
+    compact = charger_modele(os.path.join(tmp_path, "knn"))
+
+    assert compact.predict(np.array([[0.0]])) == pytest.approx([15.0])
+    assert modele.predict(np.array([[0.0]])) == pytest.approx([15.0])
+
+
+def test_export_lisible_par_tous_et_jamais_remplace(tmp_path):
+    X_train, y_train, X = donnees()
+    dossier = os.path.join(tmp_path, "modele")
+    exporter_modele(LinearRegression().fit(X_train, y_train), dossier)
+    meta = os.stat(os.path.join(dossier, "meta.json"))
+
+    exporter_modele(LinearRegression().fit(X_train[:50], y_train[:50]), dossier)
+
+    assert stat.S_IMODE(os.stat(dossier).st_mode) == 0o755
+    assert os.stat(os.path.join(dossier, "meta.json")).st_ino == meta.st_ino
+    assert os.listdir(tmp_path) == ["modele"]
@@ -0,0 +1,29 @@
+import threading
+
+import lib_profilage
+from lib_profilage import chrono
+
+
+def test_un_seul_profil_a_la_fois(tmp_path, monkeypatch):
+    monkeypatch.setattr(lib_profilage, "dossier_profil", str(tmp_path))
+    depart = threading.Barrier(4)
+    erreurs = []
+
+    def etape(i):
+        try:
+            depart.wait()
+            for _ in range(20):
+                with chrono("entrainement", boite=i):
+                    sum(range(1000))
+        except Exception as erreur:
+            erreurs.append(erreur)
+
+    threads = [threading.Thread(target=etape, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert erreurs == []
+    assert not lib_profilage._profil_actif
+    assert list(tmp_path.glob("*.prof"))
@@ -0,0 +1,158 @@
+import os
+
+import pytest
+from bs4 import BeautifulSoup
+
+import lib_sources
+from lib_sources import (
+    Autosphere,
+    Source,
+    extract_puissance,
+    extraire_boite,
+    scraper_sources,
+)
+from lib_scraping import nettoyage
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def lire_fixture(nom: str) -> bytes:
+    with open(os.path.join(FIXTURES, nom), "rb") as f:
+        return f.read()
+
+
+class Vitrine(Source):
+    """Source fictive, définie par `fixtures/vitrine.html`, dont les cartes n'ont
+    pas du tout la structure de celles d'Autosphère : caractéristiques dans une
+    liste de définitions, prix avec centimes, mensualité avec sa durée.
+    """
+
+    nom = "vitrine"
+    delai = (0, 0)
+
+    def urls(self, pages: int) -> list:
+        return [f"https://vitrine.example/occasion?p={i}" for i in range(1, pages + 1)]
+
+    def cartes(self, soup: BeautifulSoup) -> list:
+        return soup.select("li.vehicule")
+
+    def analyser(self, carte) -> dict:
+        specs = {
+            dt.get_text(strip=True): dd.get_text(strip=True)
+            for dt, dd in zip(carte.select("dl.specs dt"), carte.select("dl.specs dd"))
+        }
+        marque = carte.select_one("span.marque").get_text(strip=True)
+        modele = carte.select_one("span.modele").get_text(strip=True)
+        boite = extraire_boite(specs.get("Boîte", ""))
+        return {
+            "Référence": carte["data-href"],
+            "Nom": f"{marque} {modele}",
+            "Marque": marque,
+            "Modèle": modele,
+            "Puissance": extract_puissance(carte.select_one("p.version").get_text()),
+            "Energie": specs.get("Énergie"),
+            "Année": specs.get("Mise en circulation"),
+            "Kilomètre": specs.get("Kilométrage"),
+            "Boite": boite[0].capitalize() if boite else None,
+            "Prix": carte.select_one("p.tarif").get_text(strip=True),
+            "Mensualité": carte.select_one("p.financement").get_text(strip=True),
+            "Localisation": carte.select_one("p.agence")["data-code-postal"],
+            "Utilitaire": False,
+        }
+
+
+class ReponseFictive:
+    def __init__(self, content: bytes, status_code: int = 200):
+        self.content = content
+        self.status_code = status_code
+
+
+def test_autosphere_annonces():
+    annonces = Autosphere().annonces(lire_fixture("autosphere.html"))
+
+    assert len(annonces) == 3
+    assert all(list(annonce) == lib_sources.SCHEMA for annonce in annonces)
+    fiesta = annonces[0]
+    assert fiesta["Source"] == "autosphere"
+    assert fiesta["Nom"] == "FORD Fiesta"
+    assert fiesta["Puissance"] == 125
+    assert fiesta["Kilomètre"] == "56 581 km"
+    assert fiesta["Boite"] == "Automatique"
+    assert fiesta["Localisation"] == "59494"
+    assert annonces[2]["Utilitaire"] is True
+
+
+def test_vitrine_annonces():
+    annonces = Vitrine().annonces(lire_fixture("vitrine.html"))
+
+    assert len(annonces) == 4
+    assert all(list(annonce) == lib_sources.SCHEMA for annonce in annonces)
+    peugeot = annonces[0]
+    assert peugeot["Source"] == "vitrine"
+    assert peugeot["Référence"] == "https://vitrine.example/annonce/101"
+    assert peugeot["Puissance"] == 130
+    assert peugeot["Boite"] == "Automatique"
+    assert peugeot["Prix"] == "18\xa0490,00\xa0€"
+    assert peugeot["Mensualité"] == "229 €/mois sur 48 mois"
+
+
+def test_nettoyage_deux_sources():
+    annonces = Autosphere().annonces(lire_fixture("autosphere.html"))
+    annonces += Vitrine().annonces(lire_fixture("vitrine.html"))
+
+    df = nettoyage(annonces)
+
+    # L'utilitaire d'Autosphère et la Ford Puma de Vitrine, dont l'année est
+    # illisible ("NC"), sont écartés sans interrompre le nettoyage.
+    assert df["Nom"].to_list() == [
+        "FORD Fiesta",
+        "RENAULT Clio",
+        "PEUGEOT 308",
+        "TOYOTA Yaris",
+        "CITROEN C3",
+    ]
+    assert df["Source"].to_list() == ["autosphere"] * 2 + ["vitrine"] * 3
+    assert df["Prix"].to_list() == [15799, 16490, 18490, 21900, 13290]
+    assert df["Mensualité"].to_list() == [186, 199, 229, 265, 169]
+    assert df["Kilomètre"].to_list() == [56581, 12040, 42300, 8950, 31200]
+    assert df["Année"].to_list() == [2020, 2023, 2021, 2024, 2022]
+    assert df["Boite"].to_list() == ["Automatique", "Manuelle"] * 2 + ["Manuelle"]
+    assert df["IDF"].to_list() == [False, True, True, False, True]
+
+
+def test_scraper_sources_conserve_les_autres_pages(monkeypatch):
+    pages = {
+        "https://vitrine.example/occasion?p=1": lire_fixture("vitrine.html"),
+        "https://vitrine.example/occasion?p=3": lire_fixture("vitrine.html"),
+    }
+
+    def get(url, timeout):
+        if url.endswith("p=2"):
+            raise ConnectionError("page injoignable")
+        if url not in pages:
+            return ReponseFictive(b"", status_code=503)
+        return ReponseFictive(pages[url])
+
+    class EnPanne(Vitrine):
+        nom = "en_panne"
+
+        def urls(self, pages: int) -> list:
+            raise RuntimeError("source indisponible")
+
+    monkeypatch.setattr(lib_sources, "get", get)
+
+    voitures = scraper_sources([Vitrine(), EnPanne()], pages=4)
+
+    assert len(voitures) == 8
+    assert {voiture["Source"] for voiture in voitures} == {"vitrine"}
+
+
+def test_source_abstraite():
+    class Incomplete(Source):
+        nom = "incomplete"
+
+        def urls(self, pages: int) -> list:
+            return []
+
+    with pytest.raises(TypeError):
+        Incomplete()